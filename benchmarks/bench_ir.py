@@ -0,0 +1,161 @@
+"""Benchmarks for the IR encoding engine of Follow Me by IR.
+
+Runs without Home Assistant: only the pure encoding modules of the
+integration are imported.
+
+    python benchmarks/bench_ir.py             # run and compare with the baseline
+    python benchmarks/bench_ir.py --save      # run and store a new baseline
+    python benchmarks/bench_ir.py --quick     # fewer repetitions
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import io
+import json
+import random
+import sys
+import time
+import tracemalloc
+import types
+from array import array
+from importlib import import_module
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PACKAGE_DIR = ROOT / "custom_components" / "follow_me_by_ir"
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# Load the encoding modules without running the integration's __init__,
+# which needs Home Assistant
+_package = types.ModuleType("follow_me_by_ir")
+_package.__path__ = [str(PACKAGE_DIR)]
+sys.modules.setdefault("follow_me_by_ir", _package)
+ir = import_module("follow_me_by_ir.temperature_to_ir")
+frame = import_module("follow_me_by_ir.frame")
+
+LEVELS = (0, 1, 2, 3)
+TEMPERATURES = range(-1, 70)
+LEGACY_TIMINGS = ("4497, 4497", "588, 1657", "588, 588", "588,5601")
+
+
+def learned_code(pulse_count: int, seed: int) -> list[int]:
+    """Returns a synthetic learned code: NEC-like frames with measurement jitter."""
+    rng = random.Random(seed)
+    pulses = []
+    while len(pulses) < pulse_count:
+        pulses += [9000 + rng.randint(-40, 40), 4500 + rng.randint(-40, 40)]
+        for _ in range(32):
+            pulses += [560 + rng.randint(-20, 20), rng.choice((560, 1690)) + rng.randint(-20, 20)]
+        pulses += [560, 40000]
+    return pulses[:pulse_count]
+
+
+def measure(func, repeat: int) -> dict:
+    """Returns the best per-call latency and the peak traced memory of func."""
+    func()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"us": round(best * 1e6, 1), "peak_kib": round(peak / 1024, 1)}
+
+
+def compressed_size(payload: bytes, level: int) -> int:
+    ir.compress(out := io.BytesIO(), payload, level)
+    return len(out.getbuffer())
+
+
+def run(repeat: int) -> dict:
+    results = {}
+
+    # Frame building: legacy string path against the bytes-native builder
+    def legacy_frame():
+        command = ir.get_temp_command(21)
+        ir.hex_to_bin(command)
+        ir.hex_to_bin(ir.negate_bytes(command))
+
+    results["frame/legacy get_temp_command"] = measure(legacy_frame, repeat * 20)
+    results["frame/build_frame"] = measure(lambda: frame.build_frame(21), repeat * 20)
+    results["crc/legacy calc_crc"] = measure(lambda: ir.calc_crc([0xA4, 0x82, 0x48, 0x7F, 0x16]), repeat * 20)
+    results["crc/calc_crc"] = measure(lambda: frame.calc_crc(b"\xA4\x82\x48\x7F\x16"), repeat * 20)
+
+    # Pulse building: legacy build_raw against the compiled profile
+    binary = ir.hex_to_bin(ir.get_temp_command(21))
+    results["pulses/build_raw"] = measure(lambda: ir.build_raw(*LEGACY_TIMINGS[:3], LEGACY_TIMINGS[3], binary), repeat * 20)
+    profile = ir.get_profile()
+    results["pulses/profile"] = measure(lambda: profile.write_pulses(array("H"), frame.build_frame(21)), repeat * 20)
+
+    # Whole encode over the temperature range, per level
+    for level in LEVELS:
+        codes = [ir.encode_temperature(t, level) for t in TEMPERATURES]
+        result = measure(lambda: ir.encode_temperature(21, level), repeat)
+        result["avg_code_chars"] = round(sum(map(len, codes)) / len(codes), 1)
+        result["max_fragments"] = max(map(ir.fragment_count, codes))
+        results[f"encode_temperature/level {level}"] = result
+
+    codes = [ir.encode_temperature(t, ir.COMPRESSION_AUTO) for t in TEMPERATURES]
+    result = measure(lambda: ir.encode_temperature(21, ir.COMPRESSION_AUTO), repeat)
+    result["avg_code_chars"] = round(sum(map(len, codes)) / len(codes), 1)
+    result["max_fragments"] = max(map(ir.fragment_count, codes))
+    results["encode_temperature/auto"] = result
+
+    code = ir.encode_temperature(21)
+    results["decode_frame"] = measure(lambda: ir.decode_frame(code), repeat * 5)
+
+    # Compressor alone on the FollowMe frame and synthetic learned codes
+    payloads = {"followme": array("H")}
+    profile.write_pulses(payloads["followme"], frame.build_frame(21)[:6])
+    profile.write_pulses(payloads["followme"], frame.build_frame(21)[6:])
+    for pulse_count in (300, 1000, 3000):
+        payloads[f"learned {pulse_count}"] = learned_code(pulse_count, pulse_count)
+
+    for name, pulses in payloads.items():
+        payload = array("H", pulses).tobytes()
+        for level in LEVELS:
+            result = measure(lambda: compressed_size(payload, level), max(1, repeat // 5))
+            size = compressed_size(payload, level)
+            code = ir.encode_ir(pulses, level)
+            result["bytes"] = size
+            result["ratio"] = round(len(payload) / size, 2)
+            result["fragments"] = ir.fragment_count(code)
+            results[f"compress/{name}/level {level}"] = result
+
+    return results
+
+
+def report(results: dict, baseline: dict | None) -> None:
+    for name, result in results.items():
+        line = f"{name:<36}" + "  ".join(f"{key}={value}" for key, value in result.items())
+        if baseline and name in baseline:
+            previous = baseline[name]["us"]
+            if previous:
+                line += f"  ({(result['us'] - previous) / previous:+.0%} vs baseline)"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--quick", action="store_true", help="fewer repetitions")
+    args = parser.parse_args()
+
+    results = run(repeat=5 if args.quick else 25)
+    baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else None
+    report(results, baseline)
+
+    if args.save:
+        BASELINE.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline saved to {BASELINE}")
+
+
+if __name__ == "__main__":
+    main()
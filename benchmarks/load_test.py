@@ -0,0 +1,296 @@
+"""Load test of Follow Me by IR without IR blasters.
+
+Starts the integration with many config entries inside a local Home
+Assistant test instance. A stand-in `zha.issue_zigbee_cluster_command`
+service simulates latency, failures and a rate limit, and synthetic
+temperature sensors drive the entries. Needs Home Assistant and
+pytest-homeassistant-custom-component:
+
+    pip install pytest-homeassistant-custom-component
+    python benchmarks/load_test.py                          # 100 devices following 10 sensors for 60 s
+    python benchmarks/load_test.py --devices 300 --sensors 30 --change-rate 0.2
+    python benchmarks/load_test.py --latency 250 --failure-rate 0.05 --rate-limit 5
+    python benchmarks/load_test.py --send-mode adaptive --json results.json
+
+Reports event loop lag, sends per second, process CPU per device and the
+end-to-end latency from a sensor change to the send of the new code.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import inspect
+import json
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+# The core first, importing the loader on its own is circular
+from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant import loader
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.setup import async_setup_component
+from pytest_homeassistant_custom_component.common import (MockConfigEntry,
+                                                          async_test_home_assistant)
+
+ROOT = Path(__file__).resolve().parent.parent
+DOMAIN = "follow_me_by_ir"
+
+# Sampling period of the event loop lag probe, in seconds
+LAG_PROBE_INTERVAL = 0.05
+
+
+def percentiles(samples: list[float]) -> dict:
+    """Return the mean, p50, p95, p99 and max of samples, in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def at(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 1)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 1),
+        "p50_ms": at(0.50),
+        "p95_ms": at(0.95),
+        "p99_ms": at(0.99),
+        "max_ms": round(ordered[-1] * 1000, 1),
+    }
+
+
+class FakeZha():
+    """
+    Stand-in for the ZHA cluster command service. Calls take a random
+    latency, fail at a given rate and are rejected above a rate limit,
+    like a congested Zigbee coordinator.
+    """
+
+    def __init__(self, latency: float, jitter: float, failure_rate: float, rate_limit: float) -> None:
+        self._latency = latency
+        self._jitter = jitter
+        self._failure_rate = failure_rate
+        self._rate_limit = rate_limit
+        self._allowance = rate_limit
+        self._updated = time.monotonic()
+        self.calls: list[tuple[float, str, str]] = []
+        self.failed = 0
+        self.rejected = 0
+
+    def _within_rate_limit(self, now: float) -> bool:
+        if not self._rate_limit:
+            return True
+        self._allowance = min(self._rate_limit, self._allowance + (now - self._updated) * self._rate_limit)
+        self._updated = now
+        if self._allowance < 1:
+            return False
+        self._allowance -= 1
+        return True
+
+    async def async_handle(self, call: ServiceCall) -> None:
+        if not self._within_rate_limit(time.monotonic()):
+            self.rejected += 1
+            raise HomeAssistantError("Zigbee coordinator busy")
+
+        await asyncio.sleep(max(0.0, random.gauss(self._latency, self._jitter)))
+
+        if random.random() < self._failure_rate:
+            self.failed += 1
+            raise HomeAssistantError("No ACK from the IR blaster")
+
+        self.calls.append((time.monotonic(), call.data["ieee"], call.data["params"]["code"]))
+
+
+class LoadTest():
+    """Drives the synthetic sensors and collects the measurements."""
+
+    def __init__(self, hass: HomeAssistant, args: argparse.Namespace, zha: FakeZha) -> None:
+        self._hass = hass
+        self._args = args
+        self._zha = zha
+        self._rng = random.Random(args.seed)
+        self.sensors = [f"sensor.load_test_{index}" for index in range(args.sensors)]
+        self.devices = [f"00:00:00:00:00:{index >> 8:02x}:{index & 0xFF:02x}:01" for index in range(args.devices)]
+        self.followers = {sensor: [] for sensor in self.sensors}
+        for index, ieee in enumerate(self.devices):
+            self.followers[self.sensors[index % len(self.sensors)]].append(ieee)
+        self.changes = 0
+        self.lag: list[float] = []
+        self.latency: list[float] = []
+        # Temperature each device has to send and the time of the sensor change causing it
+        self._targets: dict[str, tuple[int, float]] = {}
+        self._sent: dict[str, int] = {}
+        self._coordinators: dict[str, object] = {}
+        self._codes: dict[str, int] = {}
+
+    def options(self, index: int) -> dict:
+        return {
+            "SCAN_INTERVAL": self._args.scan_interval,
+            "IR_BLASTER_IEEE": self.devices[index],
+            "TEMPERATURE_ENTITY_ID": self.sensors[index % len(self.sensors)],
+            "SEND_MODE": self._args.send_mode,
+            "KEEPALIVE_INTERVAL": self._args.keepalive_interval,
+            "DEADBAND": self._args.deadband,
+            "HYSTERESIS": self._args.hysteresis,
+        }
+
+    async def async_setup(self) -> float:
+        """Set up one entry per device, return the setup time."""
+        for sensor in self.sensors:
+            self._hass.states.async_set(sensor, f"{self._rng.uniform(18, 26):.1f}")
+
+        for index in range(len(self.devices)):
+            options = self.options(index)
+            MockConfigEntry(domain=DOMAIN, version=1, minor_version=2,
+                            data=options, options=options).add_to_hass(self._hass)
+
+        start = time.perf_counter()
+        assert await async_setup_component(self._hass, DOMAIN, {})
+        await self._hass.async_block_till_done()
+        elapsed = time.perf_counter() - start
+
+        for entry in self._hass.config_entries.async_entries(DOMAIN):
+            coordinator = self._hass.data[DOMAIN][entry.entry_id]
+            self._coordinators[coordinator.device.ieee] = coordinator
+
+        code_table = self._hass.data[DOMAIN]["code_table"]
+        self._codes = {await code_table.async_get(temperature, compression_level="auto"): temperature for temperature in range(-1, 70)}
+        return elapsed
+
+    async def _async_probe_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+            self.lag.append(max(0.0, loop.time() - start - LAG_PROBE_INTERVAL))
+
+    async def _async_drive_sensor(self, sensor: str) -> None:
+        value = float(self._hass.states.get(sensor).state)
+        while True:
+            await asyncio.sleep(self._rng.expovariate(self._args.change_rate))
+            value += self._rng.choice((-0.1, 0.1)) * self._rng.randint(1, 5)
+            changed_at = time.monotonic()
+            self._hass.states.async_set(sensor, f"{value:.1f}")
+            self.changes += 1
+
+            # Give the state change listeners a turn, then note the new targets
+            await asyncio.sleep(0)
+            for ieee in self.followers[sensor]:
+                temperature = self._coordinators[ieee].device.temperature
+                target = self._targets.get(ieee)
+                if temperature != self._sent.get(ieee) and (target is None or target[0] != temperature):
+                    self._targets[ieee] = (temperature, changed_at)
+
+    async def _async_match_sends(self) -> None:
+        """Turn the service calls into end-to-end latencies of changed values."""
+        seen = 0
+        while True:
+            await asyncio.sleep(0.1)
+            calls = self._zha.calls
+            for sent_at, ieee, code in calls[seen:]:
+                temperature = self._codes.get(code)
+                self._sent[ieee] = temperature
+                target = self._targets.get(ieee)
+                if target is not None and target[0] == temperature:
+                    self.latency.append(sent_at - target[1])
+                    del self._targets[ieee]
+            seen = len(calls)
+
+    async def async_run(self) -> dict:
+        setup_time = await self.async_setup()
+
+        cpu_start = time.process_time()
+        start = time.monotonic()
+        tasks = [asyncio.create_task(self._async_probe_lag()),
+                 asyncio.create_task(self._async_match_sends())]
+        tasks += [asyncio.create_task(self._async_drive_sensor(sensor)) for sensor in self.sensors]
+
+        await asyncio.sleep(self._args.duration)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        duration = time.monotonic() - start
+        cpu = time.process_time() - cpu_start
+
+        totals = {"sends": 0, "skipped": 0, "coalesced": 0, "errors": 0, "payload_bytes": 0}
+        for coordinator in self._coordinators.values():
+            metrics = coordinator.device.metrics
+            for key in totals:
+                totals[key] += getattr(metrics, key)
+
+        return {
+            "devices": len(self.devices),
+            "sensors": len(self.sensors),
+            "duration_s": round(duration, 1),
+            "setup_s": round(setup_time, 3),
+            "sensor_changes": self.changes,
+            "service_calls_per_s": round(len(self._zha.calls) / duration, 2),
+            "service_failures": self._zha.failed,
+            "service_rejected": self._zha.rejected,
+            "device_totals": totals,
+            "unavailable_devices": sum(not c.device.available for c in self._coordinators.values()),
+            "cpu_ms_per_device_per_min": round(cpu * 1000 / len(self.devices) / (duration / 60), 2),
+            "event_loop_lag": percentiles(self.lag),
+            "end_to_end_latency": percentiles(self.latency),
+            "pending_changes": len(self._targets),
+        }
+
+
+async def async_main(args: argparse.Namespace) -> dict:
+    random.seed(args.seed)
+    # A scratch config dir keeps .storage out of the repository
+    config_dir = Path(tempfile.mkdtemp(prefix="follow_me_load_"))
+    (config_dir / "custom_components").symlink_to(ROOT / "custom_components")
+
+    # Named storage_dir before Home Assistant 2024.4
+    parameters = inspect.signature(async_test_home_assistant).parameters
+    config_arg = "config_dir" if "config_dir" in parameters else "storage_dir"
+
+    async with async_test_home_assistant(**{config_arg: str(config_dir)}) as hass:
+        # Load the integration from this repository
+        hass.data.pop(loader.DATA_CUSTOM_COMPONENTS, None)
+
+        zha = FakeZha(args.latency / 1000, args.jitter / 1000, args.failure_rate, args.rate_limit)
+        hass.services.async_register("zha", "issue_zigbee_cluster_command", zha.async_handle)
+
+        return await LoadTest(hass, args, zha).async_run()
+
+
+def report(results: dict) -> None:
+    for name, value in results.items():
+        if isinstance(value, dict):
+            value = "  ".join(f"{key}={item}" for key, item in value.items())
+        print(f"{name:<28}{value}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=100, help="config entries, one IR blaster each")
+    parser.add_argument("--sensors", type=int, default=10, help="temperature sensors shared by the devices")
+    parser.add_argument("--change-rate", type=float, default=0.1, help="state changes per sensor per second")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run")
+    parser.add_argument("--scan-interval", type=int, default=60)
+    parser.add_argument("--send-mode", choices=("fixed", "adaptive"), default="fixed")
+    parser.add_argument("--keepalive-interval", type=int, default=180)
+    parser.add_argument("--deadband", type=float, default=0.0)
+    parser.add_argument("--hysteresis", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=120, help="mean service call latency in ms")
+    parser.add_argument("--jitter", type=float, default=40, help="standard deviation of the latency in ms")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of calls failing after the latency")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="calls per second accepted, 0 for no limit")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(async_main(args))
+    report(results)
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,38 @@
 """Integration for Follow Me by IR."""
 from __future__ import annotations
 
+from functools import partial
 import logging
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import (CONF_ID,
                                  Platform)
-from homeassistant.core import HomeAssistant
-from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.core import (HomeAssistant, ServiceCall, ServiceResponse,
+                                SupportsResponse)
+from homeassistant.exceptions import ConfigEntryNotReady, HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.service import async_extract_config_entry_ids
+from homeassistant.helpers.typing import ConfigType
+import voluptuous as vol
 
-from .const import (DOMAIN, CONF_SCAN_INTERVAL, CONF_IR_BLASTER_IEEE)
+from .blaster import BlasterQueue, get_blaster_queue, parse_ieees, release_blaster_queues
+from .code_table import CodeTable
+from .const import (DOMAIN, CONF_SCAN_INTERVAL, CONF_IR_BLASTER_IEEE,
+                    CONF_TEMPERATURE_ENTITY_ID, CONF_SEND_MODE, CONF_KEEPALIVE_INTERVAL, DATA_CODE_TABLE,
+                    DATA_SCHEDULER, DATA_SOURCES,
+                    SEND_MODE_ADAPTIVE, SEND_MODE_FIXED,
+                    DEFAULT_KEEPALIVE_INTERVAL, CONF_DEADBAND, CONF_HYSTERESIS,
+                    DEFAULT_DEADBAND, DEFAULT_HYSTERESIS, CONF_COMPRESSION_LEVEL,
+                    CONF_COMPRESSION_BUDGET, DEFAULT_COMPRESSION_LEVEL,
+                    DEFAULT_COMPRESSION_BUDGET, CONF_ZHA_FAST_PATH,
+                    DEFAULT_ZHA_FAST_PATH, CONF_ENCODE_EXECUTOR,
+                    DEFAULT_ENCODE_EXECUTOR, DATA_PROFILER, SERVICE_PROFILE)
 from .coordinator import DeviceUpdateCoordinator
 from .device import Device
+from .profiler import SORT_KEYS, SendProfiler, stats_path, stats_summary
+from .scheduler import SendScheduler
+from .send_policy import AdaptiveSendPolicy, FixedSendPolicy
+from .sources import SourceTracker
 
 _LOGGER = logging.getLogger(__name__)
 _PLATFORMS = [
@@ -19,6 +40,89 @@ _PLATFORMS = [
     Platform.SWITCH
 ]
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+PROFILE_SCHEMA = vol.Schema({
+    vol.Optional("duration", default=60): vol.All(vol.Coerce(float), vol.Range(min=1, max=3600)),
+    vol.Optional("sends"): vol.All(vol.Coerce(int), vol.Range(min=1)),
+    vol.Optional("top", default=20): vol.All(vol.Coerce(int), vol.Range(min=1, max=200)),
+    vol.Optional("sort", default=SORT_KEYS[0]): vol.In(SORT_KEYS),
+    **cv.ENTITY_SERVICE_FIELDS,
+})
+
+# Options applied to the running device, other changes reload the entry
+_LIVE_OPTIONS = {
+    CONF_SCAN_INTERVAL,
+    CONF_IR_BLASTER_IEEE,
+    CONF_TEMPERATURE_ENTITY_ID,
+    CONF_SEND_MODE,
+    CONF_KEEPALIVE_INTERVAL,
+    CONF_DEADBAND,
+    CONF_HYSTERESIS,
+    CONF_COMPRESSION_LEVEL,
+    CONF_COMPRESSION_BUDGET,
+    CONF_ZHA_FAST_PATH,
+    CONF_ENCODE_EXECUTOR
+}
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Setup Follow Me by IR shared data."""
+
+    hass.data.setdefault(DOMAIN, {})
+
+    # Load the IR codes encoded in previous runs
+    code_table = CodeTable(hass)
+    await code_table.async_load()
+    hass.data[DOMAIN][DATA_CODE_TABLE] = code_table
+
+    # One scheduler spreads the sends of all entries
+    hass.data[DOMAIN][DATA_SCHEDULER] = SendScheduler(hass)
+
+    # One subscription per temperature sensor, shared by the entries following it
+    hass.data[DOMAIN][DATA_SOURCES] = SourceTracker(hass)
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_PROFILE, partial(_async_profile, hass),
+        schema=PROFILE_SCHEMA, supports_response=SupportsResponse.OPTIONAL)
+
+    return True
+
+
+async def _async_profile(hass: HomeAssistant, call: ServiceCall) -> ServiceResponse:
+    """Profile the sends of the targeted devices, all devices without a target."""
+    data = hass.data[DOMAIN]
+    if data.get(DATA_PROFILER) is not None:
+        raise HomeAssistantError("Profiling is already running.")
+
+    entry_ids = None
+    if any(field in call.data for field in cv.ENTITY_SERVICE_FIELDS):
+        entry_ids = await async_extract_config_entry_ids(hass, call)
+    coordinators = [coordinator for entry_id, coordinator in data.items()
+                    if isinstance(coordinator, DeviceUpdateCoordinator)
+                    and (entry_ids is None or entry_id in entry_ids)]
+    if not coordinators:
+        raise HomeAssistantError("No Follow Me device to profile.")
+
+    profiler = data[DATA_PROFILER] = SendProfiler(hass, coordinators)
+    try:
+        stats = await profiler.async_run(call.data["duration"], call.data.get("sends"))
+    finally:
+        data.pop(DATA_PROFILER, None)
+
+    if stats is None:
+        return {"sends": profiler.sends, "file": None, "functions": []}
+
+    path = stats_path(hass, DOMAIN)
+    await hass.async_add_executor_job(stats.dump_stats, path)
+    _LOGGER.info("Profile of %s sends written to %s.", profiler.sends, path)
+
+    return {
+        "sends": profiler.sends,
+        "file": path,
+        "functions": stats_summary(stats, call.data["sort"], call.data["top"]),
+    }
+
 
 async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> bool:
     """Setup Follow Me device from a config entry."""
@@ -34,12 +138,22 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> b
     _LOGGER.info("refresh_interval %s.", refresh_interval)
     _LOGGER.info("ieee %s.", ieee)
 
-    # Construct the device
-    device = Device(hass=hass, ieee=ieee, refresh_interval=refresh_interval)
+    # Construct the device, its id comes from the blaster the entry was created with
+    device = Device(hass=hass, ieee=ieee, refresh_interval=refresh_interval,
+                    code_table=hass.data[DOMAIN][DATA_CODE_TABLE],
+                    blasters=_blaster_queues(hass, config_entry.options),
+                    deadband=config_entry.options.get(CONF_DEADBAND, DEFAULT_DEADBAND),
+                    hysteresis=config_entry.options.get(CONF_HYSTERESIS, DEFAULT_HYSTERESIS),
+                    device_id=config_entry.data.get(CONF_IR_BLASTER_IEEE, ieee)[-5:],
+                    fast_path=config_entry.options.get(CONF_ZHA_FAST_PATH, DEFAULT_ZHA_FAST_PATH),
+                    **_compression(config_entry.options))
 
-    # Create device coordinator and fetch data
-    coordinator = DeviceUpdateCoordinator(hass, device)
-    await coordinator.async_config_entry_first_refresh()
+    # Create device coordinator, its first send is staggered by the scheduler
+    scheduler = hass.data[DOMAIN][DATA_SCHEDULER]
+    coordinator = DeviceUpdateCoordinator(hass, device, scheduler, hass.data[DOMAIN][DATA_SOURCES],
+                                          _send_policy(config_entry.options))
+    coordinator.options = dict(config_entry.options)
+    scheduler.async_add(coordinator)
 
     # Store coordinator in global data
     hass.data[DOMAIN][config_entry.entry_id] = coordinator
@@ -47,13 +161,56 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> b
     # Forward setup to all platforms
     await hass.config_entries.async_forward_entry_setups(config_entry, _PLATFORMS)
 
-    # Reload entry when its updated
+    # Follow the temperature sensor once the entities have restored their state
+    coordinator.async_set_source(config_entry.options.get(CONF_TEMPERATURE_ENTITY_ID))
+    config_entry.async_on_unload(coordinator.async_stop_source)
+
+    # Apply option changes when the entry is updated
     config_entry.async_on_unload(
-        config_entry.add_update_listener(async_reload_entry))
+        config_entry.add_update_listener(async_update_options))
 
     return True
 
 
+def _blaster_queues(hass: HomeAssistant, options) -> list[BlasterQueue]:
+    """Return the send queues of the blasters selected by the options."""
+    return [get_blaster_queue(hass, ieee)
+            for ieee in parse_ieees(options.get(CONF_IR_BLASTER_IEEE))]
+
+
+def _release_blaster_queues(hass: HomeAssistant) -> None:
+    """Drop the send queues of the blasters no device sends to any more."""
+    release_blaster_queues(hass, {
+        blaster.ieee
+        for coordinator in hass.data[DOMAIN].values()
+        if isinstance(coordinator, DeviceUpdateCoordinator)
+        for blaster in coordinator.device.blasters
+    })
+
+
+def _compression(options) -> dict:
+    """Return the encoding settings of the device selected by the options."""
+    level = options.get(CONF_COMPRESSION_LEVEL, DEFAULT_COMPRESSION_LEVEL)
+    return {
+        "compression_level": int(level) if level.isdigit() else level,
+        "compression_budget": options.get(CONF_COMPRESSION_BUDGET, DEFAULT_COMPRESSION_BUDGET) / 1000,
+        "encode_executor": options.get(CONF_ENCODE_EXECUTOR, DEFAULT_ENCODE_EXECUTOR),
+    }
+
+
+def _send_policy(options):
+    """Return the send policy selected by the options."""
+    refresh_interval = options.get(CONF_SCAN_INTERVAL)
+
+    # Select how often the code is re-sent
+    if options.get(CONF_SEND_MODE, SEND_MODE_FIXED) == SEND_MODE_ADAPTIVE:
+        return AdaptiveSendPolicy(
+            refresh_interval,
+            options.get(CONF_KEEPALIVE_INTERVAL, DEFAULT_KEEPALIVE_INTERVAL))
+
+    return FixedSendPolicy(refresh_interval)
+
+
 async def async_migrate_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> bool:
     """Migrate config entry."""
 
@@ -64,6 +221,15 @@ async def async_migrate_entry(hass: HomeAssistant, config_entry: ConfigEntry) ->
         # Unsupported downgrade
         return False
 
+    if config_entry.minor_version < 2:
+        # The device id is taken from the blaster in data, which options no longer
+        # change; keep the blaster the entities are currently keyed by
+        data = {**config_entry.data}
+        ieee = config_entry.options.get(CONF_IR_BLASTER_IEEE)
+        if ieee:
+            data[CONF_IR_BLASTER_IEEE] = ieee
+        hass.config_entries.async_update_entry(config_entry, data=data, minor_version=2)
+
     _LOGGER.debug("Migration to configuration version %s.%s successful.",
                   config_entry.version, config_entry.minor_version)
 
@@ -72,19 +238,62 @@ async def async_migrate_entry(hass: HomeAssistant, config_entry: ConfigEntry) ->
 
 async def async_unload_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> bool:
     """Unload a config entry."""
-    # Remove the coordinator from global data
+    # Unload all platforms at once
+    unload_ok = await hass.config_entries.async_unload_platforms(config_entry, _PLATFORMS)
+    if not unload_ok:
+        return False
+
+    # Remove the coordinator from global data and stop its sends
     try:
-        hass.data[DOMAIN].pop(config_entry.entry_id)
+        coordinator = hass.data[DOMAIN].pop(config_entry.entry_id)
+        hass.data[DOMAIN][DATA_SCHEDULER].async_remove(coordinator)
     except KeyError:
         _LOGGER.warning("Failed remove device from global data.")
 
-    # Forward unload to all platforms
-    for platform in _PLATFORMS:
-        await hass.config_entries.async_forward_entry_unload(config_entry, platform)
+    _release_blaster_queues(hass)
 
     return True
 
 
-async def async_reload_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> None:
-    """Reload a config entry."""
-    await hass.config_entries.async_reload(config_entry.entry_id)
+async def async_update_options(hass: HomeAssistant, config_entry: ConfigEntry) -> None:
+    """Apply changed options to the running device, reloading only when needed."""
+    coordinator = hass.data[DOMAIN][config_entry.entry_id]
+    options = config_entry.options
+    changed = {key for key in options.keys() | coordinator.options.keys()
+               if options.get(key) != coordinator.options.get(key)}
+
+    if not changed:
+        return
+
+    if changed - _LIVE_OPTIONS:
+        _LOGGER.debug("Reloading entry for changed options %s.", changed - _LIVE_OPTIONS)
+        await hass.config_entries.async_reload(config_entry.entry_id)
+        return
+
+    _LOGGER.debug("Applying changed options %s.", changed)
+    coordinator.options = dict(options)
+    device = coordinator.device
+
+    if changed & {CONF_DEADBAND, CONF_HYSTERESIS}:
+        device.set_filter(options.get(CONF_DEADBAND, DEFAULT_DEADBAND),
+                          options.get(CONF_HYSTERESIS, DEFAULT_HYSTERESIS))
+
+    if changed & {CONF_SCAN_INTERVAL, CONF_SEND_MODE, CONF_KEEPALIVE_INTERVAL}:
+        device.set_refresh_interval(options.get(CONF_SCAN_INTERVAL))
+        coordinator.async_set_policy(_send_policy(options))
+
+    if changed & {CONF_COMPRESSION_LEVEL, CONF_COMPRESSION_BUDGET, CONF_ENCODE_EXECUTOR}:
+        device.set_compression(**_compression(options))
+
+    if changed & {CONF_IR_BLASTER_IEEE, CONF_ZHA_FAST_PATH}:
+        device.set_blasters(options.get(CONF_IR_BLASTER_IEEE), _blaster_queues(hass, options),
+                            options.get(CONF_ZHA_FAST_PATH, DEFAULT_ZHA_FAST_PATH))
+        _release_blaster_queues(hass)
+        if CONF_IR_BLASTER_IEEE in changed:
+            # The new blasters have not received the code yet
+            coordinator.async_request_send()
+
+    if CONF_TEMPERATURE_ENTITY_ID in changed:
+        coordinator.async_set_source(options.get(CONF_TEMPERATURE_ENTITY_ID))
+
+    coordinator.async_update_listeners()
@@ -0,0 +1,251 @@
+"""Per IR blaster send queue for Follow Me by IR."""
+from __future__ import annotations
+
+import asyncio
+from enum import StrEnum, auto
+import logging
+import random
+import time
+
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+
+from .const import DOMAIN, DATA_BLASTERS
+from .limits import CircuitBreaker
+from .metrics import LatencyHistogram
+from .zha_direct import resolve_cluster
+
+try:
+    from zigpy.exceptions import ZigbeeException
+except ImportError:
+    # ZHA is not installed, sends fail with the service errors only
+    ZigbeeException = HomeAssistantError
+
+_LOGGER = logging.getLogger(__name__)
+
+# ZHA cluster command sending an IR code with the Zosung ZS06
+ZOSUNG_IR_CLUSTER_ID = 57348
+ZOSUNG_IR_SEND_COMMAND = 2
+ZOSUNG_IR_ENDPOINT_ID = 1
+
+# Send paths: the cached ZHA cluster, or the ZHA service
+PATH_DIRECT = "direct"
+PATH_SERVICE = "service"
+
+# Bound on one service call, in seconds
+SEND_TIMEOUT = 10
+# Failed attempts: ZHA raises zigpy delivery errors and ValueError when the
+# blaster does not answer, Home Assistant service errors when ZHA is not ready
+SEND_ERRORS = (TimeoutError, HomeAssistantError, ValueError, ZigbeeException)
+# Attempts after the first one, spaced by a jittered exponential backoff
+SEND_RETRIES = 2
+RETRY_BACKOFF = 1.0
+
+
+class SendResult(StrEnum):
+    """Outcome of a queued send."""
+
+    SENT = auto()
+    SKIPPED = auto()
+    COALESCED = auto()
+
+
+class BlasterUnavailableError(HomeAssistantError):
+    """The blaster is not reachable and its circuit breaker is open."""
+
+
+class BlasterQueue():
+    """
+    Serializes the sends to one IR blaster. At most one code waits while
+    a send is in flight and a newer code replaces it, so the latest value
+    wins. A code equal to the last acknowledged one is skipped unless it
+    is a keepalive.
+
+    Each call is bounded by SEND_TIMEOUT and failed calls are retried with
+    backoff, unless a newer code is waiting. A circuit breaker rejects
+    sends to a blaster that keeps failing.
+
+    With the fast path, chosen per send since entries sharing a blaster
+    set it apart, the ZHA cluster of the blaster is resolved once and the
+    command is issued on it directly; a stale handle is dropped and the
+    call is made through the ZHA service.
+    """
+
+    def __init__(self, hass: HomeAssistant, ieee: str) -> None:
+        self._hass = hass
+        self._ieee = ieee
+        self._pending: tuple[str, bool, bool, asyncio.Future] | None = None
+        self._worker: asyncio.Task | None = None
+        self._last_acked: str | None = None
+        self._breaker = CircuitBreaker()
+        self._cluster = None
+        self._latency = {PATH_DIRECT: LatencyHistogram(), PATH_SERVICE: LatencyHistogram()}
+
+    @property
+    def ieee(self) -> str:
+        return self._ieee
+
+    @property
+    def latency(self) -> dict[str, LatencyHistogram]:
+        """Return the latency of the ZHA command per send path, both awaited to the end."""
+        return self._latency
+
+    @property
+    def available(self) -> bool:
+        """Return False while the circuit breaker is open."""
+        return not self._breaker.is_open
+
+    async def async_send(self, code: str, keepalive: bool = True, fast_path: bool = False) -> SendResult:
+        """Queue a code, replacing the waiting one, and wait for the outcome."""
+        if self._pending is not None:
+            # A replaced keepalive still has to reach the blaster
+            keepalive = keepalive or self._pending[1]
+            _set_result(self._pending[3], SendResult.COALESCED)
+
+        future = self._hass.loop.create_future()
+        self._pending = (code, keepalive, fast_path, future)
+
+        if self._worker is None:
+            self._worker = self._hass.async_create_background_task(
+                self._async_run(), f"{DOMAIN} blaster {self._ieee}")
+
+        return await future
+
+    async def _async_run(self) -> None:
+        """Send the waiting codes one at a time."""
+        try:
+            while self._pending is not None:
+                code, keepalive, fast_path, future = self._pending
+                self._pending = None
+
+                if future.done():
+                    # The caller was cancelled while the code waited
+                    continue
+
+                if not keepalive and code == self._last_acked:
+                    _set_result(future, SendResult.SKIPPED)
+                    continue
+
+                try:
+                    sent = await self._async_send_with_retries(code, fast_path)
+                except Exception as ex:  # pylint: disable=broad-except
+                    if not future.done():
+                        future.set_exception(ex)
+                    continue
+
+                if not sent:
+                    _set_result(future, SendResult.COALESCED)
+                    continue
+
+                self._last_acked = code
+                _set_result(future, SendResult.SENT)
+        finally:
+            self._worker = None
+
+    async def _async_send_with_retries(self, code: str, fast_path: bool) -> bool:
+        """Send a code, return False if a newer code superseded a retry."""
+        attempt = 0
+        while True:
+            if not self._breaker.allow(time.monotonic()):
+                raise BlasterUnavailableError(
+                    f"IR blaster {self._ieee} is unreachable, waiting for the next probe")
+            try:
+                async with asyncio.timeout(SEND_TIMEOUT):
+                    await self._async_call(code, fast_path)
+            except SEND_ERRORS as ex:
+                if attempt >= SEND_RETRIES or self._breaker.is_open:
+                    # The send failed, a failed probe counts as one too
+                    if self._breaker.record_failure(time.monotonic()):
+                        _LOGGER.warning("IR blaster %s is unreachable: %r", self._ieee, ex)
+                    raise HomeAssistantError(
+                        f"Sending to IR blaster {self._ieee} failed: {ex!r}") from ex
+            else:
+                if self._breaker.is_open:
+                    _LOGGER.info("IR blaster %s is reachable again", self._ieee)
+                self._breaker.record_success()
+                return True
+
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+            attempt += 1
+            if self._pending is not None:
+                # A newer code replaces this one
+                return False
+
+    async def _async_call(self, code: str, fast_path: bool) -> None:
+        """Send a code, on the cached cluster if possible."""
+        if fast_path:
+            if self._cluster is None:
+                self._cluster = self._resolve_cluster()
+
+            if self._cluster is not None:
+                start = time.perf_counter()
+                try:
+                    await self._cluster.command(ZOSUNG_IR_SEND_COMMAND, code=code)
+                except (LookupError, AttributeError) as ex:
+                    # Stale after a ZHA reload or a rejoin; resolved again on the next send.
+                    # Delivery errors are failed attempts, the service would not do better.
+                    _LOGGER.debug("Cluster handle of %s is stale, using the ZHA service: %r", self._ieee, ex)
+                    self._cluster = None
+                else:
+                    self._latency[PATH_DIRECT].observe((time.perf_counter() - start) * 1000)
+                    return
+
+        start = time.perf_counter()
+        await self._async_call_service(code)
+        self._latency[PATH_SERVICE].observe((time.perf_counter() - start) * 1000)
+
+    def _resolve_cluster(self):
+        """Return the ZHA IR cluster of the blaster, None if unknown to ZHA."""
+        return resolve_cluster(self._hass, self._ieee, ZOSUNG_IR_ENDPOINT_ID, ZOSUNG_IR_CLUSTER_ID)
+
+    async def _async_call_service(self, code: str) -> None:
+        """Send a code through the ZHA cluster command service."""
+        service_data = {
+            "ieee": self._ieee,
+            "endpoint_id": ZOSUNG_IR_ENDPOINT_ID,
+            "cluster_id": ZOSUNG_IR_CLUSTER_ID,
+            "cluster_type": "in",
+            "command": ZOSUNG_IR_SEND_COMMAND,
+            "command_type": "server",
+            "params": {
+                "code": code
+            }
+        }
+
+        _LOGGER.debug("service_data is %s", service_data)
+
+        # Blocking, so the call returns once ZHA has sent the command or failed
+        await self._hass.services.async_call(
+            "zha", "issue_zigbee_cluster_command", service_data, blocking=True
+        )
+
+
+def _set_result(future: asyncio.Future, result: SendResult) -> None:
+    """Resolve the future of a send, unless its caller was cancelled."""
+    if not future.done():
+        future.set_result(result)
+
+
+def parse_ieees(value: str) -> list[str]:
+    """Return the IEEE addresses in a comma separated list, in lower case."""
+    return [ieee.strip().lower() for ieee in value.split(",") if ieee.strip()]
+
+
+def get_blaster_queue(hass: HomeAssistant, ieee: str) -> BlasterQueue:
+    """Return the send queue of a blaster, shared by all entries using it."""
+    # Entries spelling the address in another case share the queue
+    ieee = ieee.lower()
+    queues = hass.data[DOMAIN].setdefault(DATA_BLASTERS, {})
+    queue = queues.get(ieee)
+    if queue is None:
+        queue = queues[ieee] = BlasterQueue(hass, ieee)
+    return queue
+
+
+def release_blaster_queues(hass: HomeAssistant, in_use: set[str]) -> None:
+    """Drop the send queues of the blasters no entry uses any more."""
+    queues = hass.data[DOMAIN].get(DATA_BLASTERS, {})
+    for ieee in queues.keys() - in_use:
+        # A send in flight still completes, the worker holds the queue
+        del queues[ieee]
+
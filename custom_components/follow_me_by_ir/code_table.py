@@ -0,0 +1,159 @@
+"""Persistent IR code table for Follow Me by IR."""
+from __future__ import annotations
+
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+from .encoder import EXECUTOR_THREAD, CodeEncoder, blocking_guard
+from .frame import build_frame
+from .temperature_to_ir import (AUTO_CPU_BUDGET, COMPRESSION_AUTO,
+                                DEFAULT_COMPRESSION_LEVEL, DEFAULT_PROTOCOL,
+                                ENCODER_VERSION, decode_frame,
+                                fragment_count, fragments_for_length)
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_KEY = f"{DOMAIN}.codes"
+STORAGE_VERSION = 1
+SAVE_DELAY = 30
+
+
+class CodeTable():
+    """Cache of encoded FollowMe IR codes, persisted in .storage.
+
+    The FollowMe frame only depends on the integer temperature, so every
+    code is encoded once per protocol/compression setting and afterwards
+    sending is a dict lookup. Missing codes are encoded off the event
+    loop. With COMPRESSION_AUTO the winning level and the code lengths of
+    the levels tried are kept with the code.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._tables: dict[str, dict[str, str]] = {}
+        self._auto: dict[str, dict[str, dict]] = {}
+        self._encoder = CodeEncoder(hass)
+
+    @staticmethod
+    def table_key(protocol: str, compression_level: int | str,
+                  cpu_budget: float = AUTO_CPU_BUDGET) -> str:
+        """Return the key of the table for a protocol/compression setting."""
+        if compression_level == COMPRESSION_AUTO:
+            # Auto codes depend on the CPU budget they were encoded within
+            return f"{protocol}:{compression_level}@{round(cpu_budget * 1000)}"
+        return f"{protocol}:{compression_level}"
+
+    async def async_load(self) -> None:
+        """Load the stored tables, dropping ones made by another encoder."""
+        data = await self._store.async_load()
+
+        if not data:
+            return
+
+        if data.get("encoder") != ENCODER_VERSION:
+            _LOGGER.debug("Discarding IR codes of encoder version %s.", data.get("encoder"))
+            return
+
+        # Auto tables stored before the budget was part of their key are dropped
+        tables = {table_key: table for table_key, table in data.get("tables", {}).items()
+                  if not table_key.endswith(f":{COMPRESSION_AUTO}")}
+        self._tables = await self._hass.async_add_executor_job(self._validate, tables)
+        self._auto = {table_key: auto for table_key, auto in data.get("auto", {}).items()
+                      if table_key in self._tables}
+        _LOGGER.debug("Loaded %s IR code tables.", len(self._tables))
+
+    @staticmethod
+    def _validate(tables: dict[str, dict[str, str]]) -> dict[str, dict[str, str]]:
+        """Return the tables without codes that do not decode to their frame."""
+        valid = {}
+
+        for table_key, table in tables.items():
+            protocol = table_key.split(":")[0]
+            valid_table = valid[table_key] = {}
+
+            for key, code in table.items():
+                try:
+                    if decode_frame(code, protocol) == build_frame(int(key)):
+                        valid_table[key] = code
+                        continue
+                except ValueError:
+                    pass
+                _LOGGER.warning("Dropping invalid stored IR code for %s in table %s.", key, table_key)
+
+        return valid
+
+    @callback
+    def _data_to_save(self) -> dict:
+        """Return the data to be written to storage."""
+        return {
+            "encoder": ENCODER_VERSION,
+            "tables": self._tables,
+            "auto": self._auto
+        }
+
+    def peek(self, temperature: int,
+             protocol: str = DEFAULT_PROTOCOL,
+             compression_level: int | str = DEFAULT_COMPRESSION_LEVEL,
+             cpu_budget: float = AUTO_CPU_BUDGET) -> str | None:
+        """Return the IR code for a temperature if it is encoded already."""
+        table = self._tables.get(self.table_key(protocol, compression_level, cpu_budget))
+        return table.get(str(temperature)) if table else None
+
+    async def async_get(self, temperature: int,
+                        protocol: str = DEFAULT_PROTOCOL,
+                        compression_level: int | str = DEFAULT_COMPRESSION_LEVEL,
+                        cpu_budget: float = AUTO_CPU_BUDGET,
+                        executor: str = EXECUTOR_THREAD) -> str:
+        """Return the IR code for a temperature, encoding it on first use."""
+        code = self.peek(temperature, protocol, compression_level, cpu_budget)
+        if code is not None:
+            return code
+
+        with blocking_guard("Building the FollowMe frame"):
+            frame = build_frame(temperature)
+
+        code, level, lengths = await self._encoder.async_encode(
+            frame, compression_level, protocol, cpu_budget, executor)
+
+        table_key = self.table_key(protocol, compression_level, cpu_budget)
+        key = str(temperature)
+        self._tables.setdefault(table_key, {})[key] = code
+        if compression_level == COMPRESSION_AUTO:
+            self._auto.setdefault(table_key, {})[key] = {"level": level, "lengths": lengths}
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+        return code
+
+    def stats(self) -> dict:
+        """Return the code sizes per table, and the levels tried in auto tables."""
+        stats = {}
+        for table_key, table in self._tables.items():
+            if not table:
+                continue
+            codes = table.values()
+            table_stats = stats[table_key] = {
+                "codes": len(table),
+                "mean_payload_bytes": round(sum(map(len, codes)) / len(table), 1),
+                "max_fragments": max(map(fragment_count, codes)),
+            }
+
+            auto = self._auto.get(table_key)
+            if not auto:
+                continue
+            winners: dict[str, int] = {}
+            fragments: dict[str, list[int]] = {}
+            for entry in auto.values():
+                winners[str(entry["level"])] = winners.get(str(entry["level"]), 0) + 1
+                for level, length in entry["lengths"].items():
+                    fragments.setdefault(str(level), []).append(fragments_for_length(length))
+            table_stats["winning_levels"] = winners
+            # What each level would have cost, to compare with the kept codes
+            table_stats["mean_fragments_per_level"] = {
+                level: round(sum(counts) / len(counts), 2) for level, counts in fragments.items()}
+            table_stats["mean_fragments"] = round(sum(map(fragment_count, codes)) / len(table), 2)
+
+        return stats
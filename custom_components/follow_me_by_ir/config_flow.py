@@ -16,22 +16,41 @@ from homeassistant.helpers.selector import (CountrySelector,
                                             SelectSelectorMode)
 
 from .const import (DOMAIN, CONF_SCAN_INTERVAL, CONF_IR_BLASTER_IEEE,
-                    CONF_TEMPERATURE_ENTITY_ID)
+                    CONF_TEMPERATURE_ENTITY_ID, CONF_SEND_MODE,
+                    CONF_KEEPALIVE_INTERVAL, SEND_MODE_FIXED,
+                    SEND_MODE_ADAPTIVE, DEFAULT_KEEPALIVE_INTERVAL,
+                    CONF_DEADBAND, CONF_HYSTERESIS, DEFAULT_DEADBAND,
+                    DEFAULT_HYSTERESIS, CONF_COMPRESSION_LEVEL,
+                    CONF_COMPRESSION_BUDGET, COMPRESSION_LEVELS,
+                    DEFAULT_COMPRESSION_LEVEL, DEFAULT_COMPRESSION_BUDGET,
+                    CONF_ZHA_FAST_PATH, DEFAULT_ZHA_FAST_PATH,
+                    CONF_ENCODE_EXECUTOR, ENCODE_EXECUTORS,
+                    DEFAULT_ENCODE_EXECUTOR)
 
 logger = logging.getLogger(__name__)
 
 _DEFAULT_OPTIONS = {
     CONF_SCAN_INTERVAL: 60,
     CONF_IR_BLASTER_IEEE: "00:00:00:00:00:00:00:00",
-    CONF_TEMPERATURE_ENTITY_ID: "sensor.temperature"
+    CONF_TEMPERATURE_ENTITY_ID: "sensor.temperature",
+    CONF_SEND_MODE: SEND_MODE_FIXED,
+    CONF_KEEPALIVE_INTERVAL: DEFAULT_KEEPALIVE_INTERVAL,
+    CONF_DEADBAND: DEFAULT_DEADBAND,
+    CONF_HYSTERESIS: DEFAULT_HYSTERESIS,
+    CONF_COMPRESSION_LEVEL: DEFAULT_COMPRESSION_LEVEL,
+    CONF_COMPRESSION_BUDGET: DEFAULT_COMPRESSION_BUDGET,
+    CONF_ZHA_FAST_PATH: DEFAULT_ZHA_FAST_PATH,
+    CONF_ENCODE_EXECUTOR: DEFAULT_ENCODE_EXECUTOR
 }
 
+_SEND_MODES = [SEND_MODE_FIXED, SEND_MODE_ADAPTIVE]
+
 
 class FollowMeConfigFlow(ConfigFlow, domain=DOMAIN):
     """Config flow for Follow Me by IR."""
 
     VERSION = 1
-    MINOR_VERSION = 1
+    MINOR_VERSION = 2
     
     async def async_step_user(self, user_input) -> FlowResult:
         """Handle a config flow initialized by the user."""
@@ -57,6 +76,22 @@ class FollowMeConfigFlow(ConfigFlow, domain=DOMAIN):
                          description={"suggested_value": user_input.get(CONF_IR_BLASTER_IEEE, _DEFAULT_OPTIONS[CONF_IR_BLASTER_IEEE] )}): cv.string,
             vol.Required(CONF_TEMPERATURE_ENTITY_ID,
                          description={"suggested_value": user_input.get(CONF_TEMPERATURE_ENTITY_ID, _DEFAULT_OPTIONS[CONF_TEMPERATURE_ENTITY_ID] )}): cv.string,
+            vol.Required(CONF_SEND_MODE,
+                         default=user_input.get(CONF_SEND_MODE, _DEFAULT_OPTIONS[CONF_SEND_MODE])): vol.In(_SEND_MODES),
+            vol.Required(CONF_KEEPALIVE_INTERVAL,
+                         default=user_input.get(CONF_KEEPALIVE_INTERVAL, _DEFAULT_OPTIONS[CONF_KEEPALIVE_INTERVAL])): vol.All(vol.Coerce(int), vol.Range(min=30, max=600)),
+            vol.Required(CONF_DEADBAND,
+                         default=user_input.get(CONF_DEADBAND, _DEFAULT_OPTIONS[CONF_DEADBAND])): vol.All(vol.Coerce(float), vol.Range(min=0, max=2)),
+            vol.Required(CONF_HYSTERESIS,
+                         default=user_input.get(CONF_HYSTERESIS, _DEFAULT_OPTIONS[CONF_HYSTERESIS])): vol.All(vol.Coerce(float), vol.Range(min=0, max=1)),
+            vol.Required(CONF_COMPRESSION_LEVEL,
+                         default=user_input.get(CONF_COMPRESSION_LEVEL, _DEFAULT_OPTIONS[CONF_COMPRESSION_LEVEL])): vol.In(COMPRESSION_LEVELS),
+            vol.Required(CONF_COMPRESSION_BUDGET,
+                         default=user_input.get(CONF_COMPRESSION_BUDGET, _DEFAULT_OPTIONS[CONF_COMPRESSION_BUDGET])): vol.All(vol.Coerce(int), vol.Range(min=1, max=1000)),
+            vol.Required(CONF_ZHA_FAST_PATH,
+                         default=user_input.get(CONF_ZHA_FAST_PATH, _DEFAULT_OPTIONS[CONF_ZHA_FAST_PATH])): cv.boolean,
+            vol.Required(CONF_ENCODE_EXECUTOR,
+                         default=user_input.get(CONF_ENCODE_EXECUTOR, _DEFAULT_OPTIONS[CONF_ENCODE_EXECUTOR])): vol.In(ENCODE_EXECUTORS),
         })
 
         return self.async_show_form(step_id="user", data_schema=data_schema)
@@ -91,6 +126,14 @@ class FollowMeOptionsFlow(OptionsFlow):
             vol.Required(CONF_SCAN_INTERVAL): vol.All(vol.Coerce(int), vol.Range(min=5, max=180)),
             vol.Required(CONF_IR_BLASTER_IEEE): cv.string,
             vol.Required(CONF_TEMPERATURE_ENTITY_ID): cv.string,
+            vol.Required(CONF_SEND_MODE, default=SEND_MODE_FIXED): vol.In(_SEND_MODES),
+            vol.Required(CONF_KEEPALIVE_INTERVAL, default=DEFAULT_KEEPALIVE_INTERVAL): vol.All(vol.Coerce(int), vol.Range(min=30, max=600)),
+            vol.Required(CONF_DEADBAND, default=DEFAULT_DEADBAND): vol.All(vol.Coerce(float), vol.Range(min=0, max=2)),
+            vol.Required(CONF_HYSTERESIS, default=DEFAULT_HYSTERESIS): vol.All(vol.Coerce(float), vol.Range(min=0, max=1)),
+            vol.Required(CONF_COMPRESSION_LEVEL, default=DEFAULT_COMPRESSION_LEVEL): vol.In(COMPRESSION_LEVELS),
+            vol.Required(CONF_COMPRESSION_BUDGET, default=DEFAULT_COMPRESSION_BUDGET): vol.All(vol.Coerce(int), vol.Range(min=1, max=1000)),
+            vol.Required(CONF_ZHA_FAST_PATH, default=DEFAULT_ZHA_FAST_PATH): cv.boolean,
+            vol.Required(CONF_ENCODE_EXECUTOR, default=DEFAULT_ENCODE_EXECUTOR): vol.In(ENCODE_EXECUTORS),
         })
         
         return self.async_show_form(
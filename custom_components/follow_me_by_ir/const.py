@@ -5,3 +5,44 @@ DOMAIN = "follow_me_by_ir"
 CONF_SCAN_INTERVAL = "SCAN_INTERVAL"
 CONF_IR_BLASTER_IEEE = "IR_BLASTER_IEEE"
 CONF_TEMPERATURE_ENTITY_ID = "TEMPERATURE_ENTITY_ID"
+CONF_SEND_MODE = "SEND_MODE"
+CONF_KEEPALIVE_INTERVAL = "KEEPALIVE_INTERVAL"
+CONF_DEADBAND = "DEADBAND"
+CONF_HYSTERESIS = "HYSTERESIS"
+CONF_COMPRESSION_LEVEL = "COMPRESSION_LEVEL"
+CONF_COMPRESSION_BUDGET = "COMPRESSION_BUDGET"
+CONF_ZHA_FAST_PATH = "ZHA_FAST_PATH"
+CONF_ENCODE_EXECUTOR = "ENCODE_EXECUTOR"
+
+SEND_MODE_FIXED = "fixed"
+SEND_MODE_ADAPTIVE = "adaptive"
+DEFAULT_KEEPALIVE_INTERVAL = 180
+DEFAULT_DEADBAND = 0.0
+DEFAULT_HYSTERESIS = 0.0
+# "auto" keeps the shortest code encoded within the budget, in milliseconds of CPU time
+COMPRESSION_LEVELS = ["auto", "0", "1", "2", "3"]
+DEFAULT_COMPRESSION_LEVEL = "auto"
+DEFAULT_COMPRESSION_BUDGET = 10
+DEFAULT_ZHA_FAST_PATH = False
+# Where codes are encoded, Home Assistant's thread pool or a process of the integration
+ENCODE_EXECUTORS = ["thread", "process"]
+DEFAULT_ENCODE_EXECUTOR = "thread"
+
+DATA_CODE_TABLE = "code_table"
+DATA_SCHEDULER = "scheduler"
+DATA_BLASTERS = "blasters"
+DATA_SOURCES = "sources"
+DATA_PROFILER = "profiler"
+
+SIGNAL_QUEUE_UPDATED = f"{DOMAIN}_queue_updated"
+
+SERVICE_GET_CODE = "get_code"
+SERVICE_PROFILE = "profile"
+
+# Seconds between two runs of the send scheduler
+SCHEDULER_TICK = 1
+# Least Zigbee airtime budget per network, in IR code transfer parts per second and burst size
+AIRTIME_BUDGET_RATE = 4
+AIRTIME_BUDGET_BURST = 12
+# Budget rate over the airtime the scheduled sends of a network take, leaves room for changes
+AIRTIME_BUDGET_HEADROOM = 2
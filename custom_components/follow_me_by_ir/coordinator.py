@@ -1,14 +1,16 @@
 """Device update coordination for Follow Me by IR."""
 
-import datetime
 import logging
+import time
 
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.debounce import Debouncer
+from homeassistant.core import HomeAssistant, ServiceResponse, callback
 from homeassistant.helpers.update_coordinator import (CoordinatorEntity,
                                                       DataUpdateCoordinator)
 from .device import Device
 from .const import DOMAIN
+from .scheduler import SendScheduler
+from .sources import SourceTracker
+from .send_policy import FixedSendPolicy
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -16,42 +18,97 @@ _LOGGER = logging.getLogger(__name__)
 class DeviceUpdateCoordinator(DataUpdateCoordinator):
     """Device update coordinator for Follow Me by IR."""
 
-    def __init__(self, hass: HomeAssistant, device: Device) -> None:
+    def __init__(self, hass: HomeAssistant, device: Device,
+                 scheduler: SendScheduler, sources: SourceTracker,
+                 policy=None) -> None:
+        # Refreshes are driven by the integration-wide send scheduler
         super().__init__(
             hass,
             _LOGGER,
             name=DOMAIN,
-            update_interval=datetime.timedelta(seconds=device.refresh_interval),
-            request_refresh_debouncer=Debouncer(
-                hass,
-                _LOGGER,
-                cooldown=1,
-                immediate=True,
-            )
+            update_interval=None,
         )
 
         self._device = device
+        self._scheduler = scheduler
+        self._sources = sources
+        self._policy = policy or FixedSendPolicy(device.refresh_interval)
+        self._send_requested = False
+        self._source: str | None = None
+        # Options the device currently runs with
+        self.options: dict = {}
 
     @property
     def device(self) -> Device:
         """Fetch the device object."""
         return self._device
 
+    @property
+    def source(self) -> str | None:
+        """Return the entity_id of the temperature sensor followed."""
+        return self._source
+
+    @callback
+    def async_set_source(self, entity_id: str | None) -> None:
+        """Follow the temperature of an entity, replacing the previous one."""
+        self.async_stop_source()
+        self._source = entity_id
+
+        if entity_id:
+            self._sources.async_follow(entity_id, self)
+
+    @callback
+    def async_stop_source(self) -> None:
+        """Stop following the temperature sensor."""
+        if self._source:
+            self._sources.async_unfollow(self._source, self)
+        self._source = None
+
+    @callback
+    def async_set_policy(self, policy) -> None:
+        """Replace the send policy and move the next send to it."""
+        self._policy = policy
+        self._scheduler.async_reschedule(
+            self, policy.next_interval(False, time.monotonic()),
+            align=not policy.adaptive)
+
     async def _async_update_data(self) -> None:
         """Update the device data."""
-        _LOGGER.info(f"DeviceUpdateCoordinator _async_update_data")
-        
-        await self._device.send_temperature_ir()    
-        
-    async def set_temperature(self, temperature: str) -> None:
-        self._device.set_temperature( temperature ) 
+        changed = self._device.temperature != self._device.sent_temperature
+        # Scheduled sends are keepalives, requested ones may be skipped as duplicates
+        keepalive = not self._send_requested
+        self._send_requested = False
+        try:
+            await self._device.send_temperature_ir(keepalive)
+        finally:
+            # Schedule the next send according to the send policy
+            self._scheduler.async_schedule(
+                self, self._policy.next_interval(changed, time.monotonic()),
+                align=not self._policy.adaptive)
+
+    @callback
+    def async_set_temperature(self, temperature: float) -> None:
+        """Ingest a sensor reading, requesting a send when the value changed."""
+        changed = self._device.set_temperature( temperature ) 
+        self._policy.report(time.monotonic())
+
+        # Unchanged values are left to the next scheduled send
+        if not changed:
+            return
+
         # Update state
-        await self.async_request_refresh() 
+        self.async_request_send()
 
     async def set_enabled(self, enabled: bool) -> None:
         self._device.set_enabled( enabled ) 
         # Update state
-        await self.async_request_refresh() 
+        self.async_request_send()
+
+    @callback
+    def async_request_send(self) -> None:
+        """Send the current value as soon as the airtime budget allows."""
+        self._send_requested = True
+        self._scheduler.async_send_now(self)
 
 
 class DeviceCoordinatorEntity(CoordinatorEntity):
@@ -62,13 +119,33 @@ class DeviceCoordinatorEntity(CoordinatorEntity):
 
         # Save reference to device
         self._device = coordinator.device
+        # Availability, state and attributes last written
+        self._written: tuple | None = None
 
     @property
     def available(self) -> bool:
         """Check device availability."""
-        return self._device._enabled        
+        return self._device._enabled and self._device.available
 
     @property
     def enabled(self) -> bool:
-        """Check device availability."""
-        return self._device._enabled        
+        """Return whether sending is enabled, whatever the blasters' availability."""
+        return self._device._enabled
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
+        self.async_write_state_if_changed()
+
+    @callback
+    def async_write_state_if_changed(self) -> None:
+        """Write the state, unless the state and its attributes are unchanged."""
+        written = (self.available, self.state, self.extra_state_attributes)
+        if written == self._written:
+            return
+        self._written = written
+        self.async_write_ha_state()
+
+    async def async_get_code(self) -> ServiceResponse:
+        """Return the IR code of the device, kept out of the recorded state."""
+        return await self._device.async_code_info()
@@ -1,13 +1,22 @@
 """Device update coordination for Follow Me by IR."""
 
+import asyncio
 import datetime
 import logging
+import time
 
 from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers.debounce import Debouncer
 from homeassistant.helpers.update_coordinator import (CoordinatorEntity,
                                                       DataUpdateCoordinator)
-from .temperature_to_ir import encode_temperature
+from .blaster import BlasterQueue, BlasterUnavailableError, SendResult
+from .code_table import CodeTable
+from .metrics import DeviceMetrics, LatencyHistogram
+from .temperature_filter import filter_reading
+from .encoder import EXECUTOR_THREAD, blocking_guard
+from .temperature_to_ir import (AUTO_CPU_BUDGET, DEFAULT_PROTOCOL,
+                                COMPRESSION_AUTO, fragment_count)
 
 from .const import DOMAIN
 
@@ -17,103 +26,236 @@ logger = logging.getLogger(__name__)
 class Device():
     """Device update coordinator for Follow Me by IR."""
 
-    def __init__(self, hass: HomeAssistant, ieee: str, refresh_interval) -> None:
+    def __init__(self, hass: HomeAssistant, ieee: str, refresh_interval,
+                 code_table: CodeTable, blasters: list[BlasterQueue],
+                 deadband: float = 0.0, hysteresis: float = 0.0,
+                 device_id: str | None = None,
+                 compression_level: int | str = COMPRESSION_AUTO,
+                 compression_budget: float = AUTO_CPU_BUDGET,
+                 encode_executor: str = EXECUTOR_THREAD,
+                 fast_path: bool = False) -> None:
         self._hass = hass
+        self._code_table = code_table
+        self._blasters = blasters
+        self._fast_path = fast_path
         self._ieee = ieee
+        # Stays the same when the blasters are replaced, entities are keyed by it
+        self._id = device_id or ieee[-5:]
         self._enabled = True
         self._refresh_interval = refresh_interval
+        self._deadband = deadband
+        self._hysteresis = hysteresis
+        self._compression_level = compression_level
+        self._compression_budget = compression_budget
+        self._encode_executor = encode_executor
         self._temperature = None
         self._previous_temperature = None
+        self._sent_temperature = None
+        self._code = None
         self._error = None
+        self._metrics = DeviceMetrics()
 
     @property    
     def id(self) -> str:
-        return self._ieee[-5:]
+        return self._id
+
+    @property
+    def ieee(self) -> str:
+        return self._ieee
+
+    @property
+    def metrics(self) -> DeviceMetrics:
+        return self._metrics
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @property
+    def blasters(self) -> list[BlasterQueue]:
+        return self._blasters
+
+    def call_latency(self, path: str) -> LatencyHistogram:
+        """Return the ZHA command latency of a send path, over all blasters."""
+        return LatencyHistogram.merged(blaster.latency[path] for blaster in self._blasters)
+
+    @property
+    def available(self) -> bool:
+        """Return whether any of the IR blasters is reachable."""
+        return any(blaster.available for blaster in self._blasters)
+
+    @property
+    def error(self) -> Exception | None:
+        return self._error
         
     @property
     def temperature(self) -> int:
         return self._temperature
         
-    @property    
-    def id(self) -> str:
-        return self._ieee[-5:]
-        
+    @property
+    def sent_temperature(self) -> int:
+        """Return the temperature of the last successful send."""
+        return self._sent_temperature
+
     @property
     def refresh_interval(self) -> int:
         return self._refresh_interval
 
+    @property
+    def network(self) -> str:
+        """Return the Zigbee network of the blaster, all blasters are on ZHA's."""
+        return "zha"
+
+    def airtime(self) -> int:
+        """Return the Zigbee transfer parts the next send takes, over all blasters."""
+        # Only encoded codes are measured, encoding is left to the send
+        with blocking_guard("Measuring the IR code airtime"):
+            if self._temperature is not None:
+                code = self._code_table.peek(self._temperature, DEFAULT_PROTOCOL,
+                                             self._compression_level, self._compression_budget)
+                if code is not None:
+                    return fragment_count(code) * len(self._blasters)
+        return len(self._blasters)
+
     def set_enabled(self, enabled: bool) -> None:
         self._enabled = enabled
 
-    def set_temperature(self, temperature: str) -> None:
-        logger.info(f"temperature: {temperature}")
+    def set_refresh_interval(self, refresh_interval: int) -> None:
+        self._refresh_interval = refresh_interval
+
+    @property
+    def fast_path(self) -> bool:
+        return self._fast_path
+
+    def set_blasters(self, ieee: str, blasters: list[BlasterQueue], fast_path: bool = False) -> None:
+        """Send through other IR blasters from the next send on."""
+        self._ieee = ieee
+        self._blasters = blasters
+        self._fast_path = fast_path
+
+    def set_compression(self, compression_level: int | str, compression_budget: float,
+                        encode_executor: str = EXECUTOR_THREAD) -> None:
+        """Change the compression of the codes, applied from the next send on."""
+        self._compression_level = compression_level
+        self._compression_budget = compression_budget
+        self._encode_executor = encode_executor
+
+    async def _async_get_code(self, temperature: int) -> str:
+        return await self._code_table.async_get(
+            temperature, DEFAULT_PROTOCOL, self._compression_level,
+            self._compression_budget, self._encode_executor)
+
+    async def async_code_info(self) -> dict:
+        """Return the IR code of the current temperature and the last code sent, or tried."""
+        code = None
+        if self._temperature is not None:
+            code = await self._async_get_code(self._temperature)
+
+        return {
+            "temperature": self._temperature,
+            "code": code,
+            "fragments": fragment_count(code) if code else 0,
+            "sent_temperature": self._sent_temperature,
+            "last_code": self._code,
+        }
+
+    def set_filter(self, deadband: float, hysteresis: float) -> None:
+        """Change the ingest filter, applied from the next reading on."""
+        self._deadband = deadband
+        self._hysteresis = hysteresis
+
+    def restore_temperature(self, temperature: str) -> None:
+        """Restore the temperature sent before a restart, unless a reading came in."""
+        if self._temperature is None:
+            self._temperature = self._sent_temperature = int(float(temperature))
+
+    def set_temperature(self, temperature: float) -> bool:
+        """Ingest a sensor reading, return whether the temperature to send changed."""
+        logger.debug("temperature: %s", temperature)
 
         current_temperature = float(temperature)
-        temperature_to_send = round(current_temperature) 
-        trend_up = None
-
-        if self._previous_temperature is not None:
-            if self._previous_temperature < current_temperature:
-                trend_up = True
-            elif self._previous_temperature > current_temperature:
-                trend_up = False
-
-        if trend_up is not None:
-            # Summer
-            # if trend_up:
-                # temperature_to_send = int(current_temperature)
-            # else:
-                # if current_temperature % 1 > 0.0:
-                    # temperature_to_send = int(current_temperature) + 1
-                # else:
-                    # temperature_to_send = int(current_temperature)
-            # Winter
-            temperature_to_send = int(current_temperature)
+        temperature_to_send = filter_reading(current_temperature, self._previous_temperature,
+                                             self._temperature, self._deadband, self._hysteresis)
+        if temperature_to_send is None:
+            return False
 
         self._previous_temperature = current_temperature
 
-        logger.info(f"temperature_to_send: {temperature_to_send}")
+        logger.debug("temperature_to_send: %s", temperature_to_send)
+        changed = temperature_to_send != self._temperature
         self._temperature = temperature_to_send
+
+        return changed
         
-    async def send_temperature_ir(self) -> None:
+    async def send_temperature_ir(self, keepalive: bool = True) -> None:
+        metrics = self._metrics
+        temperature = self._temperature
+        start = time.perf_counter()
         try:
-            logger.info(f"temperature to send: {self._temperature}")
-            logger.info(f"enabled: {self._enabled}")
+            logger.debug("temperature to send: %s, enabled: %s", self._temperature, self._enabled)
             
-            if self._temperature is not None and self._enabled:
-                self._code = encode_temperature( self._temperature )
-                logger.info(f"ir code to send: {self._code}")
-
-                param = {
-                    "code": self._code
-                }
-         
-                service_data = {
-                    "ieee": self._ieee,
-                    "endpoint_id": 1,
-                    "cluster_id": 57348,
-                    "cluster_type": "in",
-                    "command": 2,
-                    "command_type": "server",
-                    "params": param
-                }
-        
-                message = f"service_data is {service_data}"
-                logger.info(message)
-                
-                await self._hass.services.async_call(
-                        "zha", "issue_zigbee_cluster_command", service_data, False
-                    ) 
-                #self._hass.async_create_task(
-                #    self._hass.services.async_call(
-                #        "zha", "issue_zigbee_cluster_command", service_data, False
-                #    ) 
-                #)
-                #self._hass.services.call("zha", "issue_zigbee_cluster_command", service_data, False)  
-
-                self._error = None
-        except (ValueError, TypeError) as ex:
-            self._error = ex
-            logger.error(ex)
+            if self._temperature is not None and self._enabled and self._blasters:
+                self._code = await self._async_get_code( temperature )
+                metrics.encode.observe((time.perf_counter() - start) * 1000)
+                logger.debug("ir code to send: %s", self._code)
+
+                # Encoded once, sent to all blasters at the same time, each
+                # bounded by its own timeout. The send time includes waiting
+                # behind other sends and retries, the ZHA call alone is in
+                # the latency of the blasters.
+                call_start = time.perf_counter()
+                outcomes = await asyncio.gather(
+                    *(blaster.async_send(self._code, keepalive, self._fast_path) for blaster in self._blasters),
+                    return_exceptions=True)
+                metrics.send.observe((time.perf_counter() - call_start) * 1000)
+                logger.debug("send results: %s", outcomes)
+
+                errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+                results = [outcome for outcome in outcomes if not isinstance(outcome, BaseException)]
+                if not results:
+                    raise errors[0]
 
+                for result in results:
+                    if result is SendResult.SENT:
+                        metrics.record_sent(self._code)
+                    elif result is SendResult.SKIPPED:
+                        metrics.skipped += 1
+                    else:
+                        metrics.coalesced += 1
 
+                if SendResult.SENT in results:
+                    result = SendResult.SENT
+                elif SendResult.SKIPPED in results:
+                    result = SendResult.SKIPPED
+                else:
+                    result = SendResult.COALESCED
+                metrics.record(self._previous_temperature, temperature, self._code,
+                               (time.perf_counter() - start) * 1000, result)
+
+                # A superseded code was never sent, a skipped one is on the blaster already
+                if result is not SendResult.COALESCED:
+                    self._sent_temperature = temperature
+
+                # Some blasters missed the code, the others got it
+                if errors:
+                    metrics.errors += len(errors)
+                    logger.warning("%s of %s IR blasters failed: %s", len(errors), len(outcomes), errors[0])
+                self._error = errors[0] if errors else None
+        except BlasterUnavailableError as ex:
+            # Rejected by the circuit breaker, the blaster queue logged the outage
+            metrics.errors += 1
+            metrics.record(self._previous_temperature, temperature, None,
+                           (time.perf_counter() - start) * 1000, "unavailable")
+            self._error = ex
+            logger.debug(ex)
+        except (ValueError, TypeError, HomeAssistantError) as ex:
+            metrics.errors += 1
+            metrics.record(self._previous_temperature, temperature, None,
+                           (time.perf_counter() - start) * 1000, f"error: {ex}")
+            self._error = ex
+            logger.error(ex)
+        except Exception as ex:
+            metrics.errors += 1
+            metrics.record(self._previous_temperature, temperature, None,
+                           (time.perf_counter() - start) * 1000, f"error: {ex!r}")
+            raise
@@ -0,0 +1,42 @@
+"""Diagnostics support for Follow Me by IR."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DATA_CODE_TABLE, DOMAIN
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, config_entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    coordinator = hass.data[DOMAIN][config_entry.entry_id]
+    device = coordinator.device
+    metrics = device.metrics
+
+    return {
+        "options": dict(config_entry.options),
+        "device": {
+            "id": device.id,
+            "enabled": device.enabled,
+            "fast_path": device.fast_path,
+            "blaster_available": device.available,
+            "temperature": device.temperature,
+            "sent_temperature": device.sent_temperature,
+            "error": repr(device.error) if device.error else None,
+        },
+        "metrics": metrics.as_dict(),
+        "blasters": [
+            {
+                "target": blaster.ieee,
+                "available": blaster.available,
+                "latency": {path: histogram.as_dict() for path, histogram in blaster.latency.items()},
+            }
+            for blaster in device.blasters
+        ],
+        "history": [record._asdict() for record in metrics.history],
+        "code_tables": hass.data[DOMAIN][DATA_CODE_TABLE].stats(),
+    }
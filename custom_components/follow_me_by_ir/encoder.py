@@ -0,0 +1,114 @@
+"""Off-loop IR code encoding for Follow Me by IR."""
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+import logging
+import multiprocessing
+import time
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import Event, HomeAssistant, callback
+
+from .temperature_to_ir import AUTO_CPU_BUDGET, COMPRESSION_AUTO, encode_frame
+
+_LOGGER = logging.getLogger(__name__)
+
+# Encoded frames kept in memory
+ENCODE_MEMO_SIZE = 256
+# Event loop time in seconds above which encode related work is logged
+BLOCKING_THRESHOLD = 0.005
+
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+
+
+@contextmanager
+def blocking_guard(what: str, threshold: float = BLOCKING_THRESHOLD) -> Iterator[None]:
+    """Log when the wrapped code holds the event loop longer than threshold."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if elapsed > threshold:
+            _LOGGER.warning("%s blocked the event loop for %.1f ms.", what, elapsed * 1000)
+
+
+class CodeEncoder():
+    """
+    Encodes frames in an executor, Home Assistant's thread pool or a
+    process of its own, so compression never runs on the event loop.
+    Results are memoized by frame, compression level and protocol in an
+    LRU, auto codes also by their CPU budget, and concurrent requests for the same frame share one encode.
+    """
+
+    def __init__(self, hass: HomeAssistant, memo_size: int = ENCODE_MEMO_SIZE) -> None:
+        self._hass = hass
+        self._memo: OrderedDict[tuple, tuple[str, int, dict]] = OrderedDict()
+        self._memo_size = memo_size
+        self._pending: dict[tuple, asyncio.Future] = {}
+        self._process_pool: ProcessPoolExecutor | None = None
+
+    async def async_encode(self, frame: bytes, compression_level, protocol: str,
+                           cpu_budget: float, executor: str = EXECUTOR_THREAD) -> tuple[str, int, dict]:
+        """Return the code, level and code lengths per level of a frame (see `encode_frame`)."""
+        # The budget only changes auto codes
+        if compression_level != COMPRESSION_AUTO:
+            cpu_budget = AUTO_CPU_BUDGET
+        key = (bytes(frame), compression_level, protocol, cpu_budget)
+
+        with blocking_guard("IR code memo lookup"):
+            result = self._memo.get(key)
+            if result is not None:
+                self._memo.move_to_end(key)
+                return result
+
+        future = self._pending.get(key)
+        if future is None:
+            future = self._pending[key] = self._submit(key, executor)
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+
+        # A cancelled caller leaves the encode running for the others
+        result = await asyncio.shield(future)
+
+        self._memo[key] = result
+        self._memo.move_to_end(key)
+        while len(self._memo) > self._memo_size:
+            self._memo.popitem(last=False)
+
+        return result
+
+    def _submit(self, key: tuple, executor: str) -> asyncio.Future:
+        """Start encoding, key holds the arguments of `encode_frame`."""
+        if executor == EXECUTOR_PROCESS:
+            return self._hass.async_create_task(self._async_encode_in_process(key))
+        return self._hass.async_add_executor_job(encode_frame, *key)
+
+    async def _async_encode_in_process(self, key: tuple) -> tuple[str, int, dict]:
+        try:
+            return await self._hass.loop.run_in_executor(
+                self._get_process_pool(), encode_frame, *key)
+        except BrokenProcessPool as ex:
+            _LOGGER.warning("IR encoding process failed, encoding in a thread: %r", ex)
+            self._process_pool = None
+            return await self._hass.async_add_executor_job(encode_frame, *key)
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            # Spawned, forking the multi-threaded Home Assistant process is unsafe
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+            self._hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, self._async_shutdown)
+        return self._process_pool
+
+    @callback
+    def _async_shutdown(self, _event: Event) -> None:
+        """Stop the encoding process."""
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
@@ -0,0 +1,40 @@
+"""FollowMe frame building for Follow Me by IR."""
+from __future__ import annotations
+
+# Data frame prefix of the FollowMe IR command, followed by temperature + 1 and the checksum
+FOLLOW_ME_PREFIX = bytes((0xA4, 0x82, 0x48, 0x7F))
+# Encodable temperatures, temperature + 1 is sent as an unsigned byte
+MIN_TEMPERATURE = -1
+MAX_TEMPERATURE = 69
+
+# Translation tables over all byte values
+BIT_REVERSAL = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+NEGATION = bytes(range(255, -1, -1))
+
+
+def calc_crc(byte_array: bytes) -> int:
+    """
+    Returns the checksum of a frame: the bit-reversed two's complement
+    of the sum of its bit-reversed bytes.
+    """
+    return BIT_REVERSAL[-sum(byte_array.translate(BIT_REVERSAL)) & 0xFF]
+
+
+def negate_bytes(byte_array: bytes) -> bytes:
+    """Returns the bitwise negation of every byte."""
+    return byte_array.translate(NEGATION)
+
+
+def build_command(temperature: int) -> bytes:
+    """Returns the FollowMe command frame for a temperature."""
+    if not MIN_TEMPERATURE <= temperature <= MAX_TEMPERATURE:
+        raise ValueError(f"temperature {temperature} out of range")
+
+    command = FOLLOW_ME_PREFIX + bytes((temperature + 1,))
+    return command + bytes((calc_crc(command),))
+
+
+def build_frame(temperature: int) -> bytes:
+    """Returns the FollowMe command followed by its inverted copy."""
+    command = build_command(temperature)
+    return command + negate_bytes(command)
@@ -0,0 +1,93 @@
+"""Airtime budget and circuit breaker for Follow Me by IR."""
+from __future__ import annotations
+
+import time
+
+# Consecutive failed sends, each after all its retries, opening the breaker,
+# and the probe interval while open, doubling on each failed probe
+BREAKER_THRESHOLD = 3
+BREAKER_PROBE_INTERVAL = 60
+BREAKER_MAX_PROBE_INTERVAL = 900
+
+
+class TokenBucket():
+    """Token bucket limiting the Zigbee airtime, counted in transfer parts."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def set_rate(self, rate: float, burst: float) -> None:
+        """Change the budget, the tokens in the bucket are kept."""
+        self._rate = rate
+        self._burst = burst
+
+    def consume(self, tokens: float, now: float) -> bool:
+        """Take tokens if the budget allows it."""
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+        # A send larger than the burst is let through once the bucket is full
+        if self._tokens >= min(tokens, self._burst):
+            self._tokens -= tokens
+            return True
+
+        return False
+
+
+class CircuitBreaker():
+    """
+    Stops sending to an unreachable blaster. After BREAKER_THRESHOLD
+    consecutive failed sends the breaker opens and lets one probe through per
+    probe interval; a successful probe closes it again.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD,
+                 probe_interval: float = BREAKER_PROBE_INTERVAL,
+                 max_probe_interval: float = BREAKER_MAX_PROBE_INTERVAL) -> None:
+        self._threshold = threshold
+        self._base_interval = probe_interval
+        self._max_interval = max_probe_interval
+        self._interval = probe_interval
+        self._failures = 0
+        self._open = False
+        self._next_probe = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self._open
+
+    @property
+    def failures(self) -> int:
+        return self._failures
+
+    def allow(self, now: float) -> bool:
+        """Return whether an attempt may go out now."""
+        if not self._open:
+            return True
+        if now < self._next_probe:
+            return False
+        # One probe per interval
+        self._next_probe = now + self._interval
+        return True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._open = False
+        self._interval = self._base_interval
+
+    def record_failure(self, now: float) -> bool:
+        """Count a failed send, return whether the breaker just opened."""
+        self._failures += 1
+        if self._open:
+            # Failed probe
+            self._interval = min(self._interval * 2, self._max_interval)
+            self._next_probe = now + self._interval
+            return False
+        if self._failures >= self._threshold:
+            self._open = True
+            self._next_probe = now + self._interval
+            return True
+        return False
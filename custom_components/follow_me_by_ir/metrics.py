@@ -0,0 +1,138 @@
+"""Send path instrumentation for Follow Me by IR."""
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import deque
+import time
+from typing import NamedTuple
+import zlib
+
+from .temperature_to_ir import fragment_count
+
+# Upper bounds of the latency histogram buckets in milliseconds
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+# Number of sends kept in the history of each device
+SEND_HISTORY_SIZE = 100
+
+
+class SendRecord(NamedTuple):
+    """One send of a device."""
+
+    timestamp: float
+    input_temperature: float | None
+    sent_value: int
+    code_hash: str
+    latency_ms: float
+    result: str
+
+    @staticmethod
+    def code_hash_of(code: str | None) -> str:
+        """Return a short hash identifying an IR code."""
+        return f"{zlib.crc32(code.encode()):08x}" if code else ""
+
+
+class LatencyHistogram():
+    """Fixed bucket latency histogram."""
+
+    def __init__(self) -> None:
+        self._counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        """Record one latency."""
+        self._counts[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    @property
+    def mean_ms(self) -> float | None:
+        return self.total_ms / self.count if self.count else None
+
+    def percentile_ms(self, fraction: float) -> float | None:
+        """Return the upper bound of the bucket holding the given fraction of samples."""
+        if not self.count:
+            return None
+
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self._counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max_ms
+
+    @classmethod
+    def merged(cls, histograms) -> LatencyHistogram:
+        """Return a histogram of the samples of all the given histograms."""
+        merged = cls()
+        for histogram in histograms:
+            merged._counts = [a + b for a, b in zip(merged._counts, histogram._counts)]
+            merged.count += histogram.count
+            merged.total_ms += histogram.total_ms
+            merged.max_ms = max(merged.max_ms, histogram.max_ms)
+        return merged
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.mean_ms,
+            "p50_ms": self.percentile_ms(0.5),
+            "p95_ms": self.percentile_ms(0.95),
+            "max_ms": self.max_ms,
+            "buckets": dict(zip([*map(str, LATENCY_BUCKETS_MS), "+Inf"], self._counts)),
+        }
+
+
+class DeviceMetrics():
+    """Counters and latency histograms of the sends of one device."""
+
+    def __init__(self) -> None:
+        self.sends = 0
+        self.skipped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.payload_bytes = 0
+        self.fragments = 0
+        self.encode = LatencyHistogram()
+        # From handing the code to the blasters until all of them answered
+        self.send = LatencyHistogram()
+        self._send_times: deque[float] = deque()
+        self.history: deque[SendRecord] = deque(maxlen=SEND_HISTORY_SIZE)
+
+    def record(self, input_temperature: float | None, sent_value: int,
+               code: str | None, latency_ms: float, result: str) -> None:
+        """Append a send to the history."""
+        self.history.append(SendRecord(
+            time.time(), input_temperature, sent_value,
+            SendRecord.code_hash_of(code), round(latency_ms, 3), result))
+
+    def record_sent(self, code: str) -> None:
+        """Count a code that reached the blaster."""
+        self.sends += 1
+        self.payload_bytes += len(code)
+        self.fragments += fragment_count(code)
+        self._send_times.append(time.monotonic())
+
+    @property
+    def sends_per_hour(self) -> int:
+        """Return the number of sends during the last hour."""
+        horizon = time.monotonic() - 3600
+        while self._send_times and self._send_times[0] < horizon:
+            self._send_times.popleft()
+        return len(self._send_times)
+
+    def as_dict(self) -> dict:
+        return {
+            "sends": self.sends,
+            "sends_per_hour": self.sends_per_hour,
+            "skipped": self.skipped,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "payload_bytes": self.payload_bytes,
+            "fragments": self.fragments,
+            "encode": self.encode.as_dict(),
+            "send": self.send.as_dict(),
+        }
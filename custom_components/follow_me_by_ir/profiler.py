@@ -0,0 +1,139 @@
+"""On-demand profiling of the send path of Follow Me by IR."""
+from __future__ import annotations
+
+import asyncio
+import cProfile
+from collections.abc import Callable
+import datetime
+import logging
+import pstats
+import time
+
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+
+from .coordinator import DeviceUpdateCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+SORT_KEYS = ["cumulative", "tottime", "calls"]
+# pstats field of each sort key: call count, own time or time including callees
+_SORT_FIELDS = {"cumulative": 3, "tottime": 2, "calls": 1}
+
+
+class SendProfiler():
+    """
+    Profiles the sends of some devices with cProfile, for a time or a
+    number of sends. The profiler is enabled while a send is in flight,
+    so it also sees whatever else the event loop runs meanwhile. Since
+    Python 3.12 a profiler covers every thread, so encodes in the thread
+    pool are included, and only one can be active. Nothing is patched
+    outside a run: the profiled methods are swapped on the instances and
+    restored afterwards, the class code has no profiling hooks.
+    """
+
+    def __init__(self, hass: HomeAssistant, coordinators: list[DeviceUpdateCoordinator]) -> None:
+        self._hass = hass
+        self._coordinators = coordinators
+        self._profile = cProfile.Profile()
+        self._in_flight = 0
+        self._sends = 0
+        self._max_sends: int | None = None
+        self._done = asyncio.Event()
+
+    async def async_run(self, duration: float, sends: int | None = None) -> pstats.Stats | None:
+        """Profile for duration seconds or until sends sends completed, return the stats."""
+        self._max_sends = sends
+        start = time.monotonic()
+
+        # Only one profiler can be active at a time
+        probe = cProfile.Profile()
+        try:
+            probe.enable()
+        except ValueError as ex:
+            raise HomeAssistantError(f"Cannot start profiling: {ex}") from ex
+        probe.disable()
+
+        for coordinator in self._coordinators:
+            coordinator.async_refresh = self._wrap_refresh(coordinator.async_refresh)
+
+        try:
+            async with asyncio.timeout(duration):
+                await self._done.wait()
+        except TimeoutError:
+            pass
+        finally:
+            # Back to the class methods
+            for coordinator in self._coordinators:
+                coordinator.__dict__.pop("async_refresh", None)
+            if self._in_flight:
+                self._profile.disable()
+                self._in_flight = 0
+
+        _LOGGER.debug("Profiled %s sends in %.1f s.", self._sends, time.monotonic() - start)
+
+        if not self._profile.getstats():
+            return None
+        return pstats.Stats(self._profile)
+
+    @property
+    def sends(self) -> int:
+        """Return the number of sends profiled."""
+        return self._sends
+
+    def _wrap_refresh(self, refresh: Callable) -> Callable:
+        async def async_profiled_refresh() -> None:
+            profiled = self._enable()
+            try:
+                await refresh()
+            finally:
+                if profiled:
+                    self._disable()
+        return async_profiled_refresh
+
+    def _enable(self) -> bool:
+        """Start profiling a send, return False if it is not profiled."""
+        if self._done.is_set():
+            return False
+        # Overlapping sends share one enabled profiler
+        if self._in_flight == 0:
+            try:
+                self._profile.enable()
+            except ValueError as ex:
+                # Another profiler started meanwhile, the send goes on unprofiled
+                _LOGGER.warning("Profiling stopped: %s", ex)
+                self._done.set()
+                return False
+        self._in_flight += 1
+        return True
+
+    def _disable(self) -> None:
+        if self._in_flight == 0:
+            return
+        self._in_flight -= 1
+        self._sends += 1
+        if self._in_flight == 0:
+            self._profile.disable()
+        if self._max_sends is not None and self._sends >= self._max_sends:
+            self._done.set()
+
+
+def stats_summary(stats: pstats.Stats, sort: str, top: int) -> list[dict]:
+    """Return the top functions of the stats, JSON serializable."""
+    field = _SORT_FIELDS[sort]
+    entries = sorted(stats.stats.items(), key=lambda item: item[1][field], reverse=True)
+    return [
+        {
+            "function": pstats.func_std_string(func),
+            "calls": calls,
+            "tottime_ms": round(tottime * 1000, 3),
+            "cumtime_ms": round(cumtime * 1000, 3),
+        }
+        for func, (_, calls, tottime, cumtime, _) in entries[:top]
+    ]
+
+
+def stats_path(hass: HomeAssistant, domain: str) -> str:
+    """Return the path of a new stats file in the config directory."""
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    return hass.config.path(f"{domain}_profile_{timestamp}.pstats")
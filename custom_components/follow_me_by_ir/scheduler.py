@@ -0,0 +1,219 @@
+"""Integration-wide send scheduler for Follow Me by IR."""
+from __future__ import annotations
+
+import datetime
+import logging
+import math
+import time
+import zlib
+from typing import TYPE_CHECKING
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.start import async_at_started
+
+from .const import (AIRTIME_BUDGET_BURST, AIRTIME_BUDGET_HEADROOM, AIRTIME_BUDGET_RATE,
+                    SCHEDULER_TICK, SIGNAL_QUEUE_UPDATED)
+from .limits import TokenBucket
+
+if TYPE_CHECKING:
+    from .coordinator import DeviceUpdateCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+# Fractional part of the golden ratio, spreads any number of phases evenly
+_GOLDEN = (math.sqrt(5) - 1) / 2
+# Deterministic per-device jitter added to the phase, in seconds
+_MAX_JITTER = 1.0
+# Least part of its interval between a send and the next aligned send of a device
+_MIN_ALIGNED_GAP = 0.5
+
+
+class SendScheduler():
+    """
+    Owns the send timing of every device. Sends are spread over their
+    interval with a deterministic phase per device and pass through a
+    token bucket per Zigbee network; sends over budget are deferred,
+    requested sends ahead of scheduled ones. The budget grows with the
+    airtime the scheduled sends of the network take, so they alone never
+    build a backlog. Nothing is sent before Home Assistant has started.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._due: dict[DeviceUpdateCoordinator, float | None] = {}
+        self._phases: dict[DeviceUpdateCoordinator, float] = {}
+        self._resend: set[DeviceUpdateCoordinator] = set()
+        self._requested: set[DeviceUpdateCoordinator] = set()
+        # Time of the last send and seconds between scheduled sends, per device
+        self._sent: dict[DeviceUpdateCoordinator, float] = {}
+        self._intervals: dict[DeviceUpdateCoordinator, float] = {}
+        self._buckets: dict[str, TokenBucket] = {}
+        self._registered = 0
+        self._queue_depth = 0
+        self._unsub_tick: CALLBACK_TYPE | None = None
+        self._started = False
+        async_at_started(hass, self._async_start)
+
+    @property
+    def queue_depth(self) -> int:
+        """Return the number of sends that are due but deferred."""
+        return self._queue_depth
+
+    @callback
+    def async_add(self, coordinator: DeviceUpdateCoordinator) -> None:
+        """Start scheduling a device, with its first send at its phase."""
+        phase = (self._registered * _GOLDEN) % 1
+        self._registered += 1
+        self._phases[coordinator] = phase
+        self._due[coordinator] = self._first_due(coordinator, time.monotonic())
+        self._intervals[coordinator] = coordinator.device.refresh_interval
+
+        if self._unsub_tick is None:
+            self._unsub_tick = async_track_time_interval(
+                self._hass, self._async_tick,
+                datetime.timedelta(seconds=SCHEDULER_TICK))
+
+    def _first_due(self, coordinator: DeviceUpdateCoordinator, now: float) -> float:
+        """Return the time of the first send of a device, at its phase."""
+        jitter = zlib.crc32(coordinator.device.id.encode()) / 2**32 * _MAX_JITTER
+        return now + self._phases[coordinator] * coordinator.device.refresh_interval + jitter
+
+    @callback
+    def _async_start(self, _hass: HomeAssistant) -> None:
+        """Release the sends held back until Home Assistant has started."""
+        self._started = True
+        now = time.monotonic()
+        for coordinator in self._due:
+            if coordinator in self._resend:
+                # A value arrived during startup, sent after the changes since
+                self._resend.discard(coordinator)
+                self._due[coordinator] = now
+            else:
+                self._due[coordinator] = self._first_due(coordinator, now)
+        self._async_dispatch()
+
+    @callback
+    def async_remove(self, coordinator: DeviceUpdateCoordinator) -> None:
+        """Stop scheduling a device."""
+        self._due.pop(coordinator, None)
+        self._phases.pop(coordinator, None)
+        self._resend.discard(coordinator)
+        self._requested.discard(coordinator)
+        self._sent.pop(coordinator, None)
+        self._intervals.pop(coordinator, None)
+
+        if not self._due and self._unsub_tick is not None:
+            self._unsub_tick()
+            self._unsub_tick = None
+
+    @callback
+    def async_schedule(self, coordinator: DeviceUpdateCoordinator, delay: float, align: bool = True) -> None:
+        """
+        Schedule the next send of a device in `delay` seconds. Aligned
+        sends land on the device's phase, at most `delay` seconds away
+        and at least half of it after the last send.
+        """
+        if coordinator not in self._due:
+            return
+
+        now = time.monotonic()
+        if delay > 0:
+            self._intervals[coordinator] = delay
+
+        due = now + delay
+        if coordinator in self._resend:
+            # The value changed while the previous send was in flight
+            self._resend.discard(coordinator)
+            self._requested.add(coordinator)
+            due = now
+        elif align and delay > 0:
+            offset = self._phases[coordinator] * delay
+            due = offset + math.floor((due - offset) / delay) * delay
+            # A slot just after a requested send would repeat it
+            if due <= now or due - self._sent.get(coordinator, now) < delay * _MIN_ALIGNED_GAP:
+                due += delay
+        self._due[coordinator] = due
+
+    @callback
+    def async_reschedule(self, coordinator: DeviceUpdateCoordinator, delay: float, align: bool = True) -> None:
+        """
+        Move the next send of a waiting device. A send in flight schedules
+        the next one when it completes, before startup nothing is scheduled.
+        """
+        if self._started and self._due.get(coordinator) is not None:
+            self.async_schedule(coordinator, delay, align)
+
+    @callback
+    def async_send_now(self, coordinator: DeviceUpdateCoordinator) -> None:
+        """Send as soon as the airtime budget allows."""
+        if coordinator not in self._due:
+            return
+
+        # In flight, or held back until Home Assistant has started
+        if self._due[coordinator] is None or not self._started:
+            self._resend.add(coordinator)
+            return
+
+        self._requested.add(coordinator)
+        self._due[coordinator] = time.monotonic()
+        self._async_dispatch()
+
+    def _bucket(self, network: str) -> TokenBucket:
+        bucket = self._buckets.get(network)
+        if bucket is None:
+            bucket = self._buckets[network] = TokenBucket(AIRTIME_BUDGET_RATE, AIRTIME_BUDGET_BURST)
+        return bucket
+
+    def _update_buckets(self) -> None:
+        """Fit the budget of every network to the airtime of its scheduled sends."""
+        loads: dict[str, float] = {}
+        for coordinator, interval in self._intervals.items():
+            device = coordinator.device
+            loads[device.network] = loads.get(device.network, 0) + device.airtime() / interval
+
+        # The burst stays as many seconds of the rate
+        for network, load in loads.items():
+            rate = max(AIRTIME_BUDGET_RATE, load * AIRTIME_BUDGET_HEADROOM)
+            self._bucket(network).set_rate(rate, AIRTIME_BUDGET_BURST * rate / AIRTIME_BUDGET_RATE)
+
+    @callback
+    def _async_tick(self, _now: datetime.datetime) -> None:
+        self._update_buckets()
+        self._async_dispatch()
+
+    @callback
+    def _async_dispatch(self, *_) -> None:
+        """Start the due sends in order while the budget allows."""
+        if not self._started:
+            return
+
+        now = time.monotonic()
+        # Requested sends first, then by due time
+        due = sorted(
+            ((coordinator not in self._requested, due, coordinator)
+             for coordinator, due in self._due.items()
+             if due is not None and due <= now),
+            key=lambda item: item[:2])
+
+        blocked = set()
+        deferred = 0
+        for _, _, coordinator in due:
+            device = coordinator.device
+            # Keep the order per network, a deferred send blocks later ones
+            if device.network in blocked or not self._bucket(device.network).consume(device.airtime(), now):
+                blocked.add(device.network)
+                deferred += 1
+                continue
+
+            # In flight until the coordinator schedules its next send
+            self._due[coordinator] = None
+            self._requested.discard(coordinator)
+            self._sent[coordinator] = now
+            self._hass.async_create_task(coordinator.async_refresh())
+
+        if deferred != self._queue_depth:
+            _LOGGER.debug("%s sends deferred by the airtime budget.", deferred)
+            self._queue_depth = deferred
+            async_dispatcher_send(self._hass, SIGNAL_QUEUE_UPDATED)
@@ -0,0 +1,80 @@
+"""Send interval policies for Follow Me by IR."""
+from __future__ import annotations
+
+import math
+
+# Delay after an expected sensor report before sending, to pick up its value
+REPORT_MARGIN = 2.0
+# Weight of the newest inter-report gap in the sensor period estimate
+REPORT_SMOOTHING = 0.3
+
+
+class FixedSendPolicy():
+    """Re-send the FollowMe code every scan interval."""
+
+    adaptive = False
+
+    def __init__(self, interval: float) -> None:
+        self._interval = interval
+
+    def report(self, now: float) -> None:
+        """Record a temperature report of the source sensor."""
+
+    def next_interval(self, changed: bool, now: float) -> float:
+        """Return the seconds until the next send."""
+        return self._interval
+
+
+class AdaptiveSendPolicy():
+    """
+    Send right after a change, then back off exponentially up to the
+    keepalive interval. Keepalive sends are moved to just after the
+    expected report of the source sensor, never past the backoff deadline.
+    """
+
+    adaptive = True
+
+    def __init__(self, min_interval: float, keepalive_interval: float) -> None:
+        self._min_interval = min_interval
+        self._keepalive_interval = max(min_interval, keepalive_interval)
+        self._interval = min_interval
+        self._last_report: float | None = None
+        self._report_period: float | None = None
+
+    @property
+    def report_period(self) -> float | None:
+        """Return the estimated reporting period of the source sensor."""
+        return self._report_period
+
+    def report(self, now: float) -> None:
+        """Record a temperature report of the source sensor."""
+        if self._last_report is not None:
+            gap = now - self._last_report
+            if self._report_period is None:
+                self._report_period = gap
+            else:
+                self._report_period += REPORT_SMOOTHING * (gap - self._report_period)
+        self._last_report = now
+
+    def next_interval(self, changed: bool, now: float) -> float:
+        """Return the seconds until the next send."""
+        if changed:
+            self._interval = self._min_interval
+        else:
+            self._interval = min(self._interval * 2, self._keepalive_interval)
+
+        return self._align(now, self._interval)
+
+    def _align(self, now: float, interval: float) -> float:
+        """Move a send deadline to just after the last sensor report expected before it."""
+        if not self._report_period or self._last_report is None:
+            return interval
+
+        deadline = now + interval
+        reports = math.floor((deadline - REPORT_MARGIN - self._last_report) / self._report_period)
+        aligned = self._last_report + reports * self._report_period + REPORT_MARGIN
+
+        if aligned - now < self._min_interval:
+            return interval
+
+        return aligned - now
@@ -1,33 +1,112 @@
 """Sensor platform for Follow Me by IR"""
 from __future__ import annotations
 
-from datetime import timedelta, datetime
+from collections.abc import Callable
+from dataclasses import dataclass
 import logging
+from typing import Any
 
-import voluptuous as vol
-
-from homeassistant.core import Event, EventStateChangedData, HomeAssistant, callback
-from homeassistant.helpers.event import async_track_state_change_event
-from homeassistant.helpers.event import async_track_state_change
-from homeassistant.util import Throttle
-from homeassistant.components.sensor import PLATFORM_SCHEMA, SensorEntity, SensorDeviceClass, SensorStateClass
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, SupportsResponse, callback
+from homeassistant.components.sensor import (SensorEntity, SensorDeviceClass,
+                                             SensorEntityDescription, SensorStateClass)
 from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN
-from homeassistant.const import CONF_NAME
-import homeassistant.helpers.config_validation as cv
-from homeassistant.helpers.entity import Entity
+from homeassistant.const import CONF_NAME, EntityCategory, UnitOfInformation, UnitOfTime
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers import entity_platform
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
+from homeassistant.helpers.restore_state import RestoreEntity
 
-from typing import Optional
-from homeassistant.config_entries import ConfigEntry
-from .const import DOMAIN, CONF_SCAN_INTERVAL, CONF_IR_BLASTER_IEEE, CONF_TEMPERATURE_ENTITY_ID
+from .const import DOMAIN, DATA_SCHEDULER, SERVICE_GET_CODE, SIGNAL_QUEUE_UPDATED
+from .blaster import PATH_DIRECT, PATH_SERVICE
 from .coordinator import DeviceCoordinatorEntity, DeviceUpdateCoordinator
-from .temperature_to_ir import encode_temperature
+from .device import Device
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_NAME = 'FollowMe by IR'
 
+
+@dataclass(frozen=True, kw_only=True)
+class FollowMeMetricDescription(SensorEntityDescription):
+    """Describes a send path metric sensor."""
+
+    value_fn: Callable[[Device], Any]
+    attributes_fn: Callable[[Device], dict] | None = None
+
+
+METRIC_SENSORS: tuple[FollowMeMetricDescription, ...] = (
+    FollowMeMetricDescription(
+        key="sends",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda device: device.metrics.sends,
+    ),
+    FollowMeMetricDescription(
+        key="sends_per_hour",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda device: device.metrics.sends_per_hour,
+    ),
+    FollowMeMetricDescription(
+        key="skipped_sends",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda device: device.metrics.skipped,
+    ),
+    FollowMeMetricDescription(
+        key="coalesced_sends",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda device: device.metrics.coalesced,
+    ),
+    FollowMeMetricDescription(
+        key="send_errors",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda device: device.metrics.errors,
+    ),
+    FollowMeMetricDescription(
+        key="payload_bytes",
+        device_class=SensorDeviceClass.DATA_SIZE,
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda device: device.metrics.payload_bytes,
+    ),
+    FollowMeMetricDescription(
+        key="fragments_sent",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda device: device.metrics.fragments,
+    ),
+    FollowMeMetricDescription(
+        key="encode_time",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda device: device.metrics.encode.mean_ms,
+        attributes_fn=lambda device: device.metrics.encode.as_dict(),
+    ),
+    FollowMeMetricDescription(
+        key="send_time",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda device: device.metrics.send.mean_ms,
+        attributes_fn=lambda device: device.metrics.send.as_dict(),
+    ),
+    FollowMeMetricDescription(
+        key="direct_call_time",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda device: device.call_latency(PATH_DIRECT).mean_ms,
+        attributes_fn=lambda device: device.call_latency(PATH_DIRECT).as_dict(),
+    ),
+    FollowMeMetricDescription(
+        key="service_call_time",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda device: device.call_latency(PATH_SERVICE).mean_ms,
+        attributes_fn=lambda device: device.call_latency(PATH_SERVICE).as_dict(),
+    ),
+)
+
 async def async_setup_entry(
     hass: HomeAssistant,
     config_entry: ConfigEntry,
@@ -40,34 +119,35 @@ async def async_setup_entry(
     options = config_entry.options
     
     _name = options.get(CONF_NAME, DEFAULT_NAME)
-    _temperature_entity_id = options.get(CONF_TEMPERATURE_ENTITY_ID)
-    
-    logger.info(f"Setting up sensor platform. _temperature_entity_id: {_temperature_entity_id}")
 
     # Fetch coordinator from global data
     coordinator = hass.data[DOMAIN][config_entry.entry_id]
 
     entities = []
-    entities.append(FollowMeIrSensor(coordinator, _name, _temperature_entity_id))
+    entities.append(FollowMeIrSensor(coordinator, _name))
+    entities.append(FollowMeQueueDepthSensor(coordinator, _name, hass.data[DOMAIN][DATA_SCHEDULER]))
+    entities.extend(FollowMeMetricSensor(coordinator, _name, description)
+                    for description in METRIC_SENSORS)
 
     async_add_entities(entities)
 
+    # The IR code is returned on request instead of growing the recorder
+    platform = entity_platform.async_get_current_platform()
+    platform.async_register_entity_service(
+        SERVICE_GET_CODE, {}, "async_get_code", supports_response=SupportsResponse.ONLY)
 
-class FollowMeIrSensor(DeviceCoordinatorEntity, SensorEntity):
+
+class FollowMeIrSensor(DeviceCoordinatorEntity, SensorEntity, RestoreEntity):
     """Generic sensor class for Follow Me by IR."""
 
     def __init__(self,
                  coordinator: DeviceUpdateCoordinator,
-                 name, 
-                 temperature_entity_id) -> None:
+                 name) -> None:
         DeviceCoordinatorEntity.__init__(self, coordinator)
 
         #self._hass = hass
         self._client_name = name
         self._state: str | None = None
-        self._temperature_entity_id = temperature_entity_id
-        self._code = None
-        self._error = None
         self._prop = "temperature"
         
     @property
@@ -81,9 +161,10 @@ class FollowMeIrSensor(DeviceCoordinatorEntity, SensorEntity):
     @property
     def extra_state_attributes(self):
         """Return the state attributes of the sensor."""
+        # The IR code itself is left to the get_code service
+        error = self._device.error
         state_attr = {
-            'code': self._code,
-            'error': self._error
+            'error': str(error) if error is not None else None
         }
         return state_attr
 
@@ -121,44 +202,132 @@ class FollowMeIrSensor(DeviceCoordinatorEntity, SensorEntity):
     def _handle_coordinator_update(self):
         """Update the sensor with the provided data."""
         self._state = self.native_value
-        self.async_write_ha_state()
+        self.async_write_state_if_changed()
       
     async def async_added_to_hass(self) -> None:
         """Run when entity is about to be added to hass."""
         await super().async_added_to_hass() 
 
-        logger.info('FollowMeIrSensor async_added_to_hass')  
+        logger.debug('FollowMeIrSensor async_added_to_hass')
 
-        @callback
-        async def async_update_event_state_callback(event: Event[EventStateChangedData]) -> None:
-            """Call when entity state changes."""
+        # Show the last sent temperature until the temperature sensor reports
+        last_state = await self.async_get_last_state()
+        if last_state is not None and last_state.state not in (STATE_UNAVAILABLE, STATE_UNKNOWN):
             try:
-                logger.info('async_update_event_state_callback new_state: {0}'.format(event.data["new_state"]))
-                new_state = event.data["new_state"]
-                if new_state is None or new_state.state in (STATE_UNAVAILABLE, STATE_UNKNOWN):
-                    return
-
-                await self.coordinator.set_temperature( new_state.state )
-            except (ValueError, TypeError) as ex:
-                logger.error(ex)        
-       
-        if self._temperature_entity_id:
-            self.async_on_remove(
-                async_track_state_change_event(
-                    self.hass, [self._temperature_entity_id], async_update_event_state_callback
-                )
-            )            
-            
-            temp_sensor_state = self.hass.states.get(self._temperature_entity_id)
-            logger.info('async_added_to_hass temp_sensor_state: {0}'.format(temp_sensor_state))
-            if temp_sensor_state and temp_sensor_state.state != STATE_UNKNOWN and temp_sensor_state.state != STATE_UNAVAILABLE:
-                await self.coordinator.set_temperature( temp_sensor_state.state )
+                self._device.restore_temperature(last_state.state)
+                self._state = self.native_value
+            except ValueError as ex:
+                logger.debug("Not restoring %s: %s", last_state.state, ex)
 
     async def async_will_remove_from_hass(self) -> None:
         """Run when entity will be removed from hass."""
         # Call super method to ensure lifecycle is properly handled
         await super().async_will_remove_from_hass()
 
-        logger.info('FollowMeIrSensor async_will_remove_from_hass')        
+        logger.debug('FollowMeIrSensor async_will_remove_from_hass')
+
+
+class FollowMeQueueDepthSensor(DeviceCoordinatorEntity, SensorEntity):
+    """Number of sends deferred by the integration-wide airtime budget."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    # Every entry has one showing the same number, one enabled is enough
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, coordinator: DeviceUpdateCoordinator, name, scheduler) -> None:
+        DeviceCoordinatorEntity.__init__(self, coordinator)
+
+        self._client_name = name
+        self._scheduler = scheduler
+        self._prop = "queue_depth"
+
+    @property
+    def name(self):
+        return f"{self._client_name} {self._prop}"
+
+    @property
+    def unique_id(self):
+        """Return a unique ID."""
+        return f"{self._device.id}_{self._prop}"
 
+    @property
+    def device_info(self) -> dict:
+        """Return info for device registry."""
+        return {
+            "identifiers": {
+                (DOMAIN, self._device.id)
+            },
+        }
+
+    @property
+    def available(self) -> bool:
+        """Check entity availability."""
+        return True
+
+    @property
+    def native_value(self) -> int:
+        """Return the current native value."""
+        return self._scheduler.queue_depth
 
+    async def async_added_to_hass(self) -> None:
+        """Run when entity is about to be added to hass."""
+        await super().async_added_to_hass()
+
+        self.async_on_remove(
+            async_dispatcher_connect(self.hass, SIGNAL_QUEUE_UPDATED, self.async_write_state_if_changed)
+        )
+
+
+class FollowMeMetricSensor(DeviceCoordinatorEntity, SensorEntity):
+    """Diagnostic sensor exposing one send path metric of a device."""
+
+    entity_description: FollowMeMetricDescription
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    # Histogram buckets change with every send
+    _unrecorded_attributes = frozenset({"buckets"})
+
+    def __init__(self, coordinator: DeviceUpdateCoordinator, name,
+                 description: FollowMeMetricDescription) -> None:
+        DeviceCoordinatorEntity.__init__(self, coordinator)
+
+        self.entity_description = description
+        self._client_name = name
+        self._prop = description.key
+
+    @property
+    def name(self):
+        return f"{self._client_name} {self._prop}"
+
+    @property
+    def unique_id(self):
+        """Return a unique ID."""
+        return f"{self._device.id}_{self._prop}"
+
+    @property
+    def device_info(self) -> dict:
+        """Return info for device registry."""
+        return {
+            "identifiers": {
+                (DOMAIN, self._device.id)
+            },
+        }
+
+    @property
+    def available(self) -> bool:
+        """Check entity availability."""
+        return True
+
+    @property
+    def native_value(self):
+        """Return the current native value."""
+        return self.entity_description.value_fn(self._device)
+
+    @property
+    def extra_state_attributes(self):
+        """Return the state attributes of the sensor."""
+        if self.entity_description.attributes_fn is None:
+            return None
+        return self.entity_description.attributes_fn(self._device)
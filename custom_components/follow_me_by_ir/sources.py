@@ -0,0 +1,83 @@
+"""Integration-wide temperature sensor tracking for Follow Me by IR."""
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING
+
+from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN
+from homeassistant.core import (CALLBACK_TYPE, Event, EventStateChangedData,
+                                HomeAssistant, State, callback)
+from homeassistant.helpers.event import async_track_state_change_event
+
+if TYPE_CHECKING:
+    from .coordinator import DeviceUpdateCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def reading(state: State | None) -> float | None:
+    """Return the temperature of a sensor state, None if it has no reading."""
+    if state is None or state.state in (STATE_UNAVAILABLE, STATE_UNKNOWN):
+        return None
+    try:
+        return float(state.state)
+    except ValueError:
+        _LOGGER.warning("%s is not a temperature: %s", state.entity_id, state.state)
+        return None
+
+
+class SourceTracker():
+    """
+    Routes the state changes of the temperature sensors to the devices
+    following them. Every sensor is subscribed once, whatever the number
+    of devices following it, and events are handled in the event loop
+    callback; work is only scheduled when a device needs a send.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._index: dict[str, set[DeviceUpdateCoordinator]] = {}
+        self._unsubs: dict[str, CALLBACK_TYPE] = {}
+
+    @callback
+    def async_follow(self, entity_id: str, coordinator: DeviceUpdateCoordinator) -> None:
+        """Route the readings of a sensor to a device, starting with the current one."""
+        followers = self._index.get(entity_id)
+        if followers is None:
+            followers = self._index[entity_id] = set()
+            self._unsubs[entity_id] = async_track_state_change_event(
+                self._hass, entity_id, self._async_state_changed)
+        followers.add(coordinator)
+
+        value = reading(self._hass.states.get(entity_id))
+        _LOGGER.debug("%s follows %s, current reading %s", coordinator.device.id, entity_id, value)
+        if value is not None:
+            coordinator.async_set_temperature(value)
+
+    @callback
+    def async_unfollow(self, entity_id: str, coordinator: DeviceUpdateCoordinator) -> None:
+        """Stop routing the readings of a sensor to a device."""
+        followers = self._index.get(entity_id)
+        if followers is None:
+            return
+
+        followers.discard(coordinator)
+        if not followers:
+            del self._index[entity_id]
+            self._unsubs.pop(entity_id)()
+
+    @callback
+    def _async_state_changed(self, event: Event[EventStateChangedData]) -> None:
+        """Pass a new reading to the devices following the sensor."""
+        # Attribute-only changes carry no new reading
+        old_state = event.data["old_state"]
+        new_state = event.data["new_state"]
+        if old_state is not None and new_state is not None and old_state.state == new_state.state:
+            return
+
+        value = reading(new_state)
+        if value is None:
+            return
+
+        for coordinator in self._index.get(event.data["entity_id"], ()):
+            coordinator.async_set_temperature(value)
@@ -0,0 +1,42 @@
+"""Sensor reading filter for Follow Me by IR."""
+from __future__ import annotations
+
+
+def filter_reading(reading: float, previous: float | None, temperature: int | None,
+                   deadband: float = 0.0, hysteresis: float = 0.0) -> int | None:
+    """
+    Return the temperature to send for a sensor reading, given the last
+    accepted reading and the temperature sent for it, or None when the
+    reading is within the deadband of the last accepted one.
+    """
+    # Ignore readings within the deadband of the last accepted one
+    if previous is not None and abs(reading - previous) < deadband:
+        return None
+
+    temperature_to_send = round(reading)
+    trend_up = None
+
+    if previous is not None:
+        if previous < reading:
+            trend_up = True
+        elif previous > reading:
+            trend_up = False
+
+    if trend_up is not None:
+        # Summer
+        # if trend_up:
+            # temperature_to_send = int(reading)
+        # else:
+            # if reading % 1 > 0.0:
+                # temperature_to_send = int(reading) + 1
+            # else:
+                # temperature_to_send = int(reading)
+        # Winter
+        temperature_to_send = int(reading)
+
+    # Keep the current value until the reading leaves its range by the hysteresis
+    if (temperature is not None
+            and temperature - hysteresis <= reading < temperature + 1 + hysteresis):
+        temperature_to_send = temperature
+
+    return temperature_to_send
@@ -0,0 +1,52 @@
+"""Direct access to the ZHA IR cluster of a blaster for Follow Me by IR.
+
+Uses ZHA internals, which change between Home Assistant releases; every
+lookup that fails returns None and the caller falls back to the ZHA
+service.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _gateway(hass: HomeAssistant) -> Any | None:
+    """Return the ZHA gateway, None if ZHA is not loaded."""
+    try:
+        from homeassistant.components.zha.helpers import get_zha_gateway
+    except ImportError:
+        try:
+            # Releases before the ZHA library split
+            from homeassistant.components.zha.core.helpers import get_zha_gateway
+        except ImportError:
+            return None
+
+    try:
+        return get_zha_gateway(hass)
+    except (KeyError, ValueError, AttributeError):
+        return None
+
+
+def resolve_cluster(hass: HomeAssistant, ieee: str, endpoint_id: int, cluster_id: int) -> Any | None:
+    """Return the input cluster of a ZHA device, None if it cannot be found."""
+    try:
+        from zigpy.types import EUI64
+    except ImportError:
+        return None
+
+    gateway = _gateway(hass)
+    if gateway is None:
+        return None
+
+    try:
+        device = gateway.get_device(EUI64.convert(ieee))
+        if device is None:
+            return None
+        return device.async_get_cluster(endpoint_id, cluster_id)
+    except (KeyError, ValueError, AttributeError) as ex:
+        _LOGGER.debug("No ZHA cluster %s on %s: %r", cluster_id, ieee, ex)
+        return None
@@ -0,0 +1,136 @@
+"""Round trip checks of the IR code compression of Follow Me by IR."""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect
+import io
+import random
+import sys
+import types
+from importlib import import_module
+from pathlib import Path
+
+import pytest
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent / "custom_components" / "follow_me_by_ir"
+
+# Load the encoding module without running the integration's __init__,
+# which needs Home Assistant
+_package = types.ModuleType("follow_me_by_ir")
+_package.__path__ = [str(PACKAGE_DIR)]
+sys.modules.setdefault("follow_me_by_ir", _package)
+ir = import_module("follow_me_by_ir.temperature_to_ir")
+frame = import_module("follow_me_by_ir.frame")
+
+LEVELS = (0, 1, 2, 3)
+
+
+def _reference_level_2(data: bytes) -> bytes:
+    """Level 2 of the sorted suffix matcher that hash chains replaced."""
+    out = io.BytesIO()
+    W = 2**13
+    L = 255 + 9
+    suffixes = []
+    next_pos = idx = 0
+    key = lambda n: data[n:]  # noqa: E731
+    find_idx = lambda n: bisect(suffixes, key(n), key=key)  # noqa: E731
+
+    def find_length_max(pos):
+        nonlocal next_pos, idx
+        while next_pos <= pos:
+            if len(suffixes) == W:
+                suffixes.pop(find_idx(next_pos - W))
+            suffixes.insert(idx := find_idx(next_pos), next_pos)
+            next_pos += 1
+        limit = min(L, len(data) - pos)
+        candidates = []
+        for i in (idx + 1, idx - 1):
+            if 0 <= i < len(suffixes):
+                start, length = suffixes[i], 0
+                while length < limit and data[pos + length] == data[start + length]:
+                    length += 1
+                candidates.append((length, pos - start))
+        return max(candidates, key=lambda c: (c[0], -c[1]), default=None)
+
+    block_start = pos = 0
+    while pos < len(data):
+        if (c := find_length_max(pos)) and c[0] >= 3:
+            ir.emit_literal_blocks(out, data[block_start:pos])
+            ir.emit_distance_block(out, c[0], c[1])
+            pos += c[0]
+            block_start = pos
+        else:
+            pos += 1
+    ir.emit_literal_blocks(out, data[block_start:pos])
+    return out.getvalue()
+
+
+def _repetitive_pulses(size: int, seed: int) -> bytes:
+    """A few frames repeated in random order, with rare one unit deviations."""
+    rng = random.Random(seed)
+    frames = [[rng.choice((560, 1690)) for _ in range(rng.randint(20, 70))]
+              for _ in range(rng.randint(2, 5))]
+    pulses = []
+    while len(pulses) < size // 2:
+        pulses += [9000, 4500, *(p + (rng.random() < 0.25) for p in rng.choice(frames)), 560, 40000]
+    return array("H", pulses[:size // 2]).tobytes()
+
+
+def _payloads() -> dict[str, bytes]:
+    rng = random.Random(1)
+    return {
+        "empty": b"",
+        "one byte": b"x",
+        "two bytes": b"xy",
+        "run": b"a" * 300,
+        "short repeat": b"abcabcabcab",
+        "long literal": bytes(rng.randrange(256) for _ in range(100)),
+        "random": bytes(rng.randrange(256) for _ in range(2000)),
+        "pulses": b"".join(rng.choice((b"\x30\x02", b"\x8a\x06")) for _ in range(1500)),
+    }
+
+
+@pytest.mark.parametrize("level", LEVELS)
+@pytest.mark.parametrize("name", list(_payloads()))
+def test_compress_round_trip(name: str, level: int) -> None:
+    data = _payloads()[name]
+    ir.compress(out := io.BytesIO(), data, level)
+    assert ir.decompress(out.getvalue()) == data
+
+
+@pytest.mark.parametrize("level", LEVELS)
+def test_temperature_round_trip(level: int) -> None:
+    for temperature in range(-1, 70):
+        code = ir.encode_temperature(temperature, level)
+        assert ir.decode_frame(code) == frame.build_frame(temperature)
+
+
+@pytest.mark.parametrize("temperature", (frame.MIN_TEMPERATURE - 1, frame.MAX_TEMPERATURE + 1))
+def test_temperature_out_of_range(temperature: int) -> None:
+    with pytest.raises(ValueError, match="out of range"):
+        frame.build_frame(temperature)
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_level_2_not_longer_than_reference(seed: int) -> None:
+    data = _repetitive_pulses((3000, 6000)[seed % 2], seed)
+    ir.compress(out := io.BytesIO(), data, 2)
+    assert len(out.getvalue()) <= len(_reference_level_2(data))
+
+
+@pytest.mark.parametrize(("budget", "levels"), [(0, [1]), (0.010, [1, 2]), (0.020, [1, 2, 3])])
+def test_auto_skips_levels_estimated_over_budget(monkeypatch, budget: float, levels: list[int]) -> None:
+    clock = [0.0]
+    costs = {1: 0.001, 2: 0.0015, 3: 0.015}
+    compress = ir.compress
+
+    def timed_compress(out, data, level):
+        clock[0] += costs[level]
+        compress(out, data, level)
+
+    monkeypatch.setattr(ir.time, "thread_time", lambda: clock[0])
+    monkeypatch.setattr(ir, "compress", timed_compress)
+    code, level, lengths = ir.encode_ir_auto(ir.temperature_pulses(20), budget)
+    assert list(lengths) == levels
+    assert ir.decode_ir(code) == array("H", ir.temperature_pulses(20))
+    assert lengths[level] == min(lengths.values())
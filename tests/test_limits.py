@@ -0,0 +1,88 @@
+"""Checks of the airtime budget and circuit breaker of Follow Me by IR."""
+from __future__ import annotations
+
+import sys
+import time
+import types
+from importlib import import_module
+from pathlib import Path
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent / "custom_components" / "follow_me_by_ir"
+
+# Load the limits without running the integration's __init__,
+# which needs Home Assistant
+_package = types.ModuleType("follow_me_by_ir")
+_package.__path__ = [str(PACKAGE_DIR)]
+sys.modules.setdefault("follow_me_by_ir", _package)
+limits = import_module("follow_me_by_ir.limits")
+
+
+def test_token_bucket_limits_to_burst_then_rate() -> None:
+    bucket = limits.TokenBucket(4, 12)
+    now = time.monotonic()
+    assert bucket.consume(12, now)
+    assert not bucket.consume(1, now)
+    assert not bucket.consume(5, now + 1)
+    assert bucket.consume(4, now + 1)
+
+
+def test_token_bucket_lets_a_large_send_through_when_full() -> None:
+    bucket = limits.TokenBucket(4, 12)
+    now = time.monotonic()
+    assert bucket.consume(20, now)
+    # The overdraft is paid back before the next send
+    assert not bucket.consume(1, now + 2)
+    assert bucket.consume(1, now + 2.25)
+
+
+def test_token_bucket_set_rate_keeps_tokens() -> None:
+    bucket = limits.TokenBucket(4, 12)
+    now = time.monotonic()
+    assert bucket.consume(12, now)
+    bucket.set_rate(8, 24)
+    assert not bucket.consume(9, now + 1)
+    assert bucket.consume(16, now + 2)
+
+
+def test_breaker_opens_after_threshold_failed_sends() -> None:
+    breaker = limits.CircuitBreaker(threshold=3, probe_interval=60)
+    assert not breaker.record_failure(0)
+    assert not breaker.record_failure(1)
+    assert breaker.allow(2) and not breaker.is_open
+    assert breaker.record_failure(2)
+    assert breaker.is_open and breaker.failures == 3
+    assert not breaker.allow(61)
+
+
+def test_breaker_success_resets_failures() -> None:
+    breaker = limits.CircuitBreaker(threshold=3)
+    breaker.record_failure(0)
+    breaker.record_failure(1)
+    breaker.record_success()
+    assert breaker.failures == 0
+    assert not breaker.record_failure(2)
+    assert not breaker.is_open
+
+
+def test_breaker_probes_once_per_interval_with_backoff() -> None:
+    breaker = limits.CircuitBreaker(threshold=1, probe_interval=60, max_probe_interval=200)
+    assert breaker.record_failure(0)
+    assert breaker.allow(60)
+    assert not breaker.allow(61)
+    # Failed probes double the interval up to the maximum
+    assert not breaker.record_failure(61)
+    assert not breaker.allow(180) and breaker.allow(181)
+    breaker.record_failure(181)
+    assert not breaker.allow(380) and breaker.allow(381)
+
+
+def test_breaker_successful_probe_closes() -> None:
+    breaker = limits.CircuitBreaker(threshold=1, probe_interval=60)
+    breaker.record_failure(0)
+    breaker.record_failure(60)
+    assert breaker.allow(180)
+    breaker.record_success()
+    assert not breaker.is_open and breaker.allow(181)
+    # Reopening starts from the base interval again
+    breaker.record_failure(200)
+    assert breaker.allow(260)
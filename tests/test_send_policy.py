@@ -0,0 +1,60 @@
+"""Checks of the send interval policies of Follow Me by IR."""
+from __future__ import annotations
+
+import sys
+import types
+from importlib import import_module
+from pathlib import Path
+
+import pytest
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent / "custom_components" / "follow_me_by_ir"
+
+# Load the policies without running the integration's __init__,
+# which needs Home Assistant
+_package = types.ModuleType("follow_me_by_ir")
+_package.__path__ = [str(PACKAGE_DIR)]
+sys.modules.setdefault("follow_me_by_ir", _package)
+send_policy = import_module("follow_me_by_ir.send_policy")
+
+
+def test_fixed_policy_keeps_its_interval() -> None:
+    policy = send_policy.FixedSendPolicy(60)
+    policy.report(10.0)
+    assert [policy.next_interval(changed, 100.0) for changed in (True, False, False)] == [60, 60, 60]
+
+
+def test_adaptive_policy_backs_off_to_keepalive() -> None:
+    policy = send_policy.AdaptiveSendPolicy(30, 180)
+    intervals = [policy.next_interval(changed, 0.0) for changed in (True, False, False, False, False, True)]
+    assert intervals == [30, 60, 120, 180, 180, 30]
+
+
+def test_adaptive_keepalive_not_below_min_interval() -> None:
+    policy = send_policy.AdaptiveSendPolicy(60, 10)
+    assert [policy.next_interval(False, 0.0) for _ in range(2)] == [60, 60]
+
+
+def test_adaptive_report_period_is_smoothed() -> None:
+    policy = send_policy.AdaptiveSendPolicy(30, 180)
+    assert policy.report_period is None
+    for now in (0.0, 50.0, 110.0):
+        policy.report(now)
+    assert policy.report_period == pytest.approx(50 + send_policy.REPORT_SMOOTHING * 10)
+
+
+def test_adaptive_send_follows_the_expected_report() -> None:
+    policy = send_policy.AdaptiveSendPolicy(30, 180)
+    for now in (0.0, 50.0, 100.0):
+        policy.report(now)
+    # Backed off to 60 s, moved to just after the report expected at 150 s
+    policy.next_interval(True, 100.0)
+    assert policy.next_interval(False, 100.0) == pytest.approx(50 + send_policy.REPORT_MARGIN)
+
+
+def test_adaptive_send_not_moved_below_min_interval() -> None:
+    policy = send_policy.AdaptiveSendPolicy(30, 180)
+    for now in (0.0, 50.0, 100.0):
+        policy.report(now)
+    # The only report expected in time is 2 s away, too soon after the last send
+    assert policy.next_interval(True, 100.0) == 30
@@ -0,0 +1,77 @@
+"""Checks of the sensor reading filter of Follow Me by IR."""
+from __future__ import annotations
+
+import sys
+import types
+from importlib import import_module
+from pathlib import Path
+
+import pytest
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent / "custom_components" / "follow_me_by_ir"
+
+# Load the filter without running the integration's __init__,
+# which needs Home Assistant
+_package = types.ModuleType("follow_me_by_ir")
+_package.__path__ = [str(PACKAGE_DIR)]
+sys.modules.setdefault("follow_me_by_ir", _package)
+temperature_filter = import_module("follow_me_by_ir.temperature_filter")
+filter_reading = temperature_filter.filter_reading
+
+
+def _ingest(readings: list[float], deadband: float = 0.0, hysteresis: float = 0.0) -> list[int]:
+    """Return the temperature to send after each reading, as Device.set_temperature keeps it."""
+    previous = temperature = None
+    sent = []
+    for reading in readings:
+        result = filter_reading(reading, previous, temperature, deadband, hysteresis)
+        if result is not None:
+            previous, temperature = reading, result
+        sent.append(temperature)
+    return sent
+
+
+@pytest.mark.parametrize(("reading", "expected"), [(20.4, 20), (20.5, 20), (20.6, 21), (21.5, 22)])
+def test_first_reading_is_rounded(reading: float, expected: int) -> None:
+    assert filter_reading(reading, None, None) == expected
+
+
+@pytest.mark.parametrize("previous", (19.0, 21.9))
+def test_trend_is_truncated(previous: float) -> None:
+    # Up or down, a reading that moved is truncated
+    assert filter_reading(20.9, previous, None) == 20
+
+
+def test_unchanged_reading_is_rounded() -> None:
+    assert filter_reading(20.6, 20.6, None) == 21
+
+
+@pytest.mark.parametrize(("reading", "expected"), [
+    (19.5, 20),    # T - h, kept
+    (19.49, 19),   # below T - h
+    (21.49, 20),   # below T + 1 + h, kept
+    (21.5, 21),    # T + 1 + h, left
+])
+def test_hysteresis_boundaries(reading: float, expected: int) -> None:
+    assert filter_reading(reading, 20.0, 20, hysteresis=0.5) == expected
+
+
+def test_without_hysteresis_the_range_is_one_degree() -> None:
+    assert filter_reading(20.0, 20.5, 20) == 20
+    assert filter_reading(21.0, 20.5, 20) == 21
+
+
+@pytest.mark.parametrize(("reading", "ignored"), [(20.25, True), (20.5, False), (19.75, True), (19.5, False)])
+def test_deadband_boundary(reading: float, ignored: bool) -> None:
+    result = filter_reading(reading, 20.0, 20, deadband=0.5)
+    assert (result is None) == ignored
+
+
+def test_deadband_accumulates_drift() -> None:
+    # Each step is within the deadband, the distance to the last accepted reading is not
+    assert _ingest([20.0, 20.25, 20.5, 20.75, 21.0], deadband=0.5) == [20, 20, 20, 20, 21]
+
+
+def test_deadband_and_hysteresis_combined() -> None:
+    readings = [22.0, 21.75, 21.25, 20.75, 20.5, 20.25]
+    assert _ingest(readings, deadband=0.5, hysteresis=0.5) == [22, 22, 21, 21, 21, 20]